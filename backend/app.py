@@ -1,8 +1,13 @@
 from flask import Flask, jsonify, request, render_template, send_from_directory
 from flask_cors import CORS
+import os
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from gamesFromMLB import *
-from databaseCode import fetch_team, fetch_player, fetch_players, fetch_games, fetch_record, fetch_team_list
+from databaseCode import fetch_team, fetch_player, fetch_players, fetch_games, fetch_record, fetch_team_list, fetch_games_in_range, fetch_head_to_head
 from fakeDB import db_elements
+import scrapeSession
+from refreshScheduler import RefreshScheduler
 from chat import make_flashcards_from_selection, read_streak_file
 
 app = Flask(__name__, static_folder='static/build', template_folder='templates')
@@ -30,7 +35,6 @@ def read_config(file_path):
     return config
 
 CORS(app)  # Enable Cross-Origin Resource Sharing for React frontend
-mlb_data_dict = get_mlb_team_data(data) #gives us a dictionary request of all mlb data
 
 @app.route('/api/mlb_team_list', methods=['GET'])
 def mlb_team_list():
@@ -40,22 +44,20 @@ def mlb_team_list():
 @app.route('/api/get_team_leaders')
 def get_team_leaders_endpoint():
     team_name = request.args.get('teamName', 'Chicago Cubs')  # Default to 'Chicago Cubs' if no 'teamName' parameter is provided
-    leaders_unrefined, standing = get_team_leaders_dict(mlb_data_dict, team_name)
+    leaders_unrefined, standing = get_team_leaders_dict(get_team_registry(), team_name)
     leaders_refined = get_team_leaders(leaders_unrefined)
     return jsonify({'standing': standing, 'leaders': leaders_refined})
 
 @app.route('/api/get_five_recent_games')
 def get_five_recent_games():
     team_name = request.args.get('teamName', 'Chicago Cubs')  # Default to 'Chicago Cubs' if no 'teamName' parameter is provided
+    mlb_data_dict = get_team_registry()
     games_dict = game_history_five(mlb_data_dict, team_name, mlb_data_dict[team_name]['lastYearSchedule'])
     record = games_dict[0]
     game_history = games_dict[1:] # This is a list of five games
     return jsonify({'record': record, 'game_history': game_history})
 
-@app.route('/api/fetch_data_from_database')
-def get_data():
-    parameter = request.args.get('parameter', 'Chicago Cubs')
-    tableName = request.args.get('tableName', 'Teams')
+def fetch_table(tableName, parameter):
     result = ""
     match tableName:
         case "Teams":
@@ -70,13 +72,56 @@ def get_data():
             result = fetch_games(parameter, True)
         case "Records":
             result = fetch_record(parameter)
+    return result
 
-    return jsonify(result)
+@app.route('/api/fetch_data_from_database')
+def get_data():
+    parameter = request.args.get('parameter', 'Chicago Cubs')
+    tableName = request.args.get('tableName', 'Teams')
+    return jsonify(fetch_table(tableName, parameter))
+
+# Runs the fetches of one batch request side by side, each thread gets its own cursor on the shared DuckDB connection
+batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv('BATCH_FETCH_WORKERS', '6')))
+
+@app.route('/api/fetch_data_from_database/batch', methods=['POST'])
+def get_data_batch():
+    #body: [{"tableName": "Records", "parameter": "Chicago Cubs"}, ...], returns the list of results in the same order
+    #so a page can load everything it needs in one round trip
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, list) or not all(isinstance(item, dict) and 'tableName' in item for item in batch):
+        return jsonify({'error': 'expected a list of {"tableName", "parameter"} objects'}), 400
+    results = batch_pool.map(lambda item: fetch_table(item['tableName'], item.get('parameter', 'Chicago Cubs')), batch)
+    return jsonify(list(results))
 
 @app.route('/api/fetch_team_list')
 def get_team_list():
     return jsonify(fetch_team_list())
 
+@app.route('/api/games_in_range')
+def games_in_range():
+    team_name = request.args.get('teamName', 'Chicago Cubs')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    try:
+        datetime.strptime(start or '', '%Y-%m-%d')
+        datetime.strptime(end or '', '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'start and end are required, as YYYY-MM-DD'}), 400
+    return jsonify(fetch_games_in_range(team_name, start, end))
+
+@app.route('/api/head_to_head')
+def head_to_head():
+    team_name = request.args.get('teamName', 'Chicago Cubs')
+    opponent = request.args.get('opponent')
+    season = request.args.get('season', type=int)
+    if not opponent:
+        return jsonify({'error': 'opponent is required'}), 400
+    return jsonify(fetch_head_to_head(team_name, opponent, season))
+
+@app.route('/api/scrape_metrics')
+def scrape_metrics():
+    return jsonify(scrapeSession.metrics())
+
 @app.route('/api/keyword_search', methods=['GET'])
 def search_by_keyword():
     keywords = request.args.get('keywords', "")
@@ -118,4 +163,8 @@ def test_message():
     return jsonify({"message": "Hello from Flask!"})
 
 if __name__ == '__main__':
+    warm_up()
+    if os.getenv('REFRESH_IN_API') == '1' and os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        # only in the process serving requests, not the debug reloader watching it (see refreshScheduler.py)
+        RefreshScheduler().start()
     app.run(debug=True)
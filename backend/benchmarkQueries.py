@@ -0,0 +1,91 @@
+import duckdb
+import os
+import statistics
+import sys
+import tempfile
+import time
+import dbConnection
+import databaseCode
+
+'''
+Times every fetch_* read path at 1x, 10x and 100x the data of one season, with and without databaseCode.INDEXES, to
+check that lookups stay flat as the tables grow. The data is synthetic, nothing is scraped. fetch_team_list returns
+every team, so it grows with the data no matter what. The query cache is turned off while timing, otherwise every call
+after the first would be a cache hit and we'd be timing a dict lookup.
+
+python benchmarkQueries.py [scale ...]
+'''
+
+SCALES = [1, 10, 100]
+TEAMS = 30
+PLAYERS_PER_TEAM = 45
+GAMES_PER_SEASON = 2430
+REPEAT = int(os.getenv('BENCHMARK_REPEAT', '200'))
+
+TEAM = 'Team 7'
+PLAYER = 'Player 7'
+
+FETCHES = {
+    'fetch_team': lambda: databaseCode.fetch_team(TEAM),
+    'fetch_player': lambda: databaseCode.fetch_player(PLAYER),
+    'fetch_players': lambda: databaseCode.fetch_players(TEAM),
+    'fetch_games (played)': lambda: databaseCode.fetch_games(TEAM, True),
+    'fetch_games (upcoming)': lambda: databaseCode.fetch_games(TEAM, False),
+    'fetch_record': lambda: databaseCode.fetch_record(TEAM),
+    'fetch_team_list': lambda: databaseCode.fetch_team_list(),
+}
+
+def build_database(path, scale, indexed):
+    #scale times the rows of one season, spread over scale times as many teams so every team (and TEAM) keeps one
+    #season worth of rows. What changes between scales is how much there is to search through, not the result size
+    teams = TEAMS * scale
+    with duckdb.connect(path) as con:
+        databaseCode.create_tables(con)
+        if not indexed:
+            for table, columns in databaseCode.INDEXES.items():
+                for column in columns:
+                    con.sql(f"DROP INDEX IF EXISTS idx_{table}_{column}")
+        con.execute("INSERT INTO Teams SELECT 'logo', 'T' || i, 'url', 'schedule', 'roster', 'lastYear', 'Team ' || i, i \
+                    FROM range(?) t(i)", [teams])
+        con.execute("INSERT INTO Players SELECT 'Player ' || i, 'SP', NULL, 'Team ' || (i % ?), ['Pitchers'], i \
+                    FROM range(?) t(i)", [teams, teams * PLAYERS_PER_TEAM])
+        # every team is home against the next team 81 times
+        con.execute("INSERT INTO Games SELECT i, CAST(i AS VARCHAR), 'Team ' || (i % ?), 'Team ' || ((i + 1) % ?), \
+                    CAST(DATE '2000-03-28' + CAST(i // ? AS INTEGER) AS VARCHAR), 1, 5, 3 FROM range(?) t(i)",
+                    [teams, teams, teams, GAMES_PER_SEASON * scale])
+        con.execute("INSERT INTO Records SELECT 'Team ' || i, 90, 72 FROM range(?) t(i)", [teams])
+        con.execute("INSERT INTO UpcomingGames SELECT 'Team ' || i, 'Team 0', '2030-04-01' FROM range(?) t(i)", [teams])
+
+def time_fetches():
+    timings = {}
+    for name, fetch in FETCHES.items():
+        fetch() # first call opens the connection
+        samples = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            fetch()
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples) * 1000
+    return timings
+
+def run(scales=SCALES):
+    results = {}
+    databaseCode.QUERY_CACHE_SIZE = 0
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for scale in scales:
+            for indexed in (False, True):
+                path = os.path.join(tmpDir, f"bench_{scale}_{indexed}.db")
+                build_database(path, scale, indexed)
+                dbConnection._manager = dbConnection.ConnectionManager(path)
+                results[(scale, indexed)] = time_fetches()
+                dbConnection._manager.close()
+    return results
+
+def print_results(results):
+    columns = list(results.keys())
+    print(f"{'median ms':<24}" + "".join(f"{f'{scale}x' + (' idx' if indexed else ''):>10}" for scale, indexed in columns))
+    for name in FETCHES:
+        print(f"{name:<24}" + "".join(f"{results[column][name]:>10.3f}" for column in columns))
+
+if __name__ == "__main__":
+    print_results(run([int(scale) for scale in sys.argv[1:]] or SCALES))
@@ -1,149 +1,431 @@
 import duckdb
-from gamesFromMLB import return_team_list, get_mlb_scores, get_mlb_team_data, get_all_players_list, game_history_five, next_game_team
+from dbConnection import fetch_dicts, file_id, version, writing
+from gamesFromMLB import return_team_list, get_team_registry, extract_year, iter_all_players, get_team_players_list, game_history_five, next_game_team, get_team_leaders_dict, iter_schedules
 from datetime import datetime
-import numpy as np
+import hashlib
+import pyarrow as pa
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# 'incremental' only writes rows that are new or changed since the last run, 'full' rewrites every scraped row
+INGEST_MODE = os.getenv('INGEST_MODE', 'incremental')
+# rows per transaction when writing a scrape into a table, readers see a long load fill in batch by batch. Each batch
+# goes over as one Arrow table, so a smaller batch costs a few more statements, not a row at a time
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', '500'))
+
+# Max number of query results kept in memory by the fetch_* functions, 0 turns the cache off
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+
+_generations = (None, {}) # (version() it was read at, table -> generation from TableGenerations)
+_query_cache = OrderedDict() # (query name, params) -> ((file id, generations of the tables it reads), rows), least recently used first
+_query_cache_lock = threading.Lock()
+query_cache_stats = {'hits': 0, 'misses': 0}
+
+def bump_generation(con, *tables):
+    #call inside every write transaction, before its commit. Cached results that read one of tables are stale once it
+    #commits, in every process: the generations live in the database, next to the rows they describe
+    con.sql(TABLE_SCHEMAS['TableGenerations'])
+    for table in tables:
+        con.execute("INSERT INTO TableGenerations VALUES (?, 1) \
+                    ON CONFLICT (tableName) DO UPDATE SET generation = generation + 1", [table])
+
+def table_generations():
+    #table -> generation as of the last commit we can see. Only read from the database again after version() changed,
+    #every write (ours, or another process's, which made the manager reconnect) changes it
+    global _generations
+    seen = version()
+    if _generations[0] != seen:
+        try:
+            rows = fetch_dicts("SELECT tableName, generation FROM TableGenerations")
+        except duckdb.CatalogException:
+            rows = [] # nothing has been written since generations were added
+        _generations = (seen, {row['tableName']: row['generation'] for row in rows})
+    return _generations[1]
+
+def clear_query_cache():
+    with _query_cache_lock:
+        _query_cache.clear()
+
+def _row_hash(row):
+    #scraped values are mostly strings while duckdb gives back ints/bools/lists, so compare everything as text
+    return hashlib.sha1(json.dumps([str(value) for value in row]).encode('utf-8')).hexdigest()
+
+def _arrow_column(values):
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if value is None else str(value) for value in values]) # mixed types, DuckDB casts on insert
+
+def _arrow_table(columns, rows):
+    #rows (tuples in the order of columns) as a pyarrow Table, DuckDB casts each column to the target column's type
+    return pa.table({column: _arrow_column([row[i] for row in rows]) for i, column in enumerate(columns)})
+
+def _with_arrow(con, name, columns, rows, query):
+    #runs query with rows visible to it as the table name, one statement for the whole batch instead of executemany
+    con.register(name, _arrow_table(columns, rows))
+    try:
+        con.execute(query)
+    finally:
+        con.unregister(name)
+
+def batched(rows, size):
+    #splits any iterable into lists of at most size items without reading it all first
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _write_rows(db, table, columns, keyColumns, rows, idColumn=None, prune=True, scope=None, batchSize=None):
+    #writes rows (tuples in the order of columns) into table of the database at db (None for DB_PATH), matching existing
+    #rows on keyColumns (the natural key)
+    #rows can be a generator, it is consumed batchSize rows at a time and every batch is committed on its own, so rows
+    #show up while the scrape is still running and a failure halfway keeps the batches already written. The database is
+    #only held (see dbConnection.writing) while a batch is written, never while the generator is scraping the next one
+    #idColumn is a surrogate integer key that is kept for existing rows and handed out from max + 1 for new ones
+    #prune deletes rows whose key wasn't scraped this time, only once every row was written so a failed run never deletes anything
+    #scope=(column, value) limits the compare/prune to that slice of the table, e.g. ('team', 'Chicago Cubs') when only one team was scraped
+    #returns the inserted/updated/unchanged/deleted counts
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    dataColumns = [col for col in columns if col != idColumn]
+    columnIdx = [columns.index(col) for col in dataColumns]
+    keyIdx = [dataColumns.index(col) for col in keyColumns]
+    valueColumns = [col for col in dataColumns if col not in keyColumns]
+
+    scopeWhere, scopeParams = (f" WHERE {scope[0]} = ?", [scope[1]]) if scope else ("", [])
+
+    existing = {}
+    keptRowids = {}
+    duplicates = []
+    with writing(db) as con:
+        for rowid, *row in con.execute(f"SELECT rowid, {', '.join(dataColumns)} FROM {table}{scopeWhere}", scopeParams).fetchall():
+            key = tuple(str(row[i]) for i in keyIdx)
+            if key in keptRowids:
+                # more than one row with the same key (left over from the reload-everything days), the oldest one stays
+                if rowid > keptRowids[key]:
+                    duplicates.append(rowid)
+                    continue
+                duplicates.append(keptRowids[key])
+            keptRowids[key] = rowid
+            existing[key] = _row_hash(row)
+
+        if duplicates:
+            con.begin()
+            try:
+                _with_arrow(con, '_duplicate_rows', ['duplicateRowid'], [(rowid,) for rowid in duplicates],
+                            f"DELETE FROM {table} WHERE rowid IN (SELECT duplicateRowid FROM _duplicate_rows)")
+                bump_generation(con, table)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            counts['deleted'] += len(duplicates)
+
+    seen = set()
+    nextId = None
+    for batch in batched(rows, batchSize or INGEST_BATCH_SIZE):
+        toInsert = []
+        toUpdate = []
+        for row in batch:
+            row = tuple(row[i] for i in columnIdx)
+            key = tuple(str(row[i]) for i in keyIdx)
+            if key in seen:
+                continue # the same game from the other team's schedule, the first one wins
+            seen.add(key)
+            oldHash = existing.get(key)
+            if oldHash is None:
+                toInsert.append(row)
+            elif INGEST_MODE == 'full' or oldHash != _row_hash(row):
+                toUpdate.append(row)
+            else:
+                counts['unchanged'] += 1
+        if not toInsert and not toUpdate:
+            continue
+
+        with writing(db) as con:
+            con.begin()
+            try:
+                if toUpdate and valueColumns:
+                    assignments = ", ".join(f"{col} = b.{col}" for col in valueColumns)
+                    where = " AND ".join(f"{table}.{col} = b.{col}" for col in keyColumns)
+                    _with_arrow(con, '_updated_rows', dataColumns, toUpdate, f"UPDATE {table} SET {assignments} FROM _updated_rows b WHERE {where}")
+                if toInsert:
+                    insertColumns = dataColumns
+                    if idColumn:
+                        if nextId is None:
+                            nextId = con.execute(f"SELECT COALESCE(MAX({idColumn}) + 1, 0) FROM {table}").fetchone()[0]
+                        toInsert = [(nextId + i,) + row for i, row in enumerate(toInsert)]
+                        nextId += len(toInsert)
+                        insertColumns = [idColumn] + dataColumns
+                    columnList = ', '.join(insertColumns)
+                    _with_arrow(con, '_new_rows', insertColumns, toInsert, f"INSERT INTO {table} ({columnList}) SELECT {columnList} FROM _new_rows")
+                bump_generation(con, table)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+        counts['updated'] += len(toUpdate)
+        counts['inserted'] += len(toInsert)
+
+    stale = [key for key in existing if key not in seen]
+    if prune and stale:
+        where = " AND ".join(f"CAST({table}.{col} AS VARCHAR) = s.{col}" for col in keyColumns)
+        with writing(db) as con:
+            con.begin()
+            try:
+                _with_arrow(con, '_stale_keys', keyColumns, stale, f"DELETE FROM {table} USING _stale_keys s WHERE {where}")
+                bump_generation(con, table)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+        counts['deleted'] += len(stale)
+
+    print(f"{table}: {counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged, {counts['deleted']} deleted")
+    return counts
+
+TABLE_SCHEMAS = {
+    'Teams': "CREATE TABLE IF NOT EXISTS Teams (Logo VARCHAR, teamAbbreviation VARCHAR, \
+            teamUrl VARCHAR, teamSchedule VARCHAR, rosterUrl VARCHAR, \
+            lastYearSchedule VARCHAR, displayName VARCHAR PRIMARY KEY, teamId INTEGER)",
+    'Players': "CREATE TABLE IF NOT EXISTS Players (name VARCHAR, position VARCHAR, \
+            headshotUrl VARCHAR, team VARCHAR, listings VARCHAR[], playerId INTEGER)",
+    # Games table, every game is stored once from the home team's point of view, older games are kept around
+    'Games': "CREATE TABLE IF NOT EXISTS Games (gameId INTEGER PRIMARY KEY, gameKey VARCHAR UNIQUE, \
+            homeTeam VARCHAR, awayTeam VARCHAR, date VARCHAR, doubleheader INTEGER, homeScore INTEGER, awayScore INTEGER)",
+    # Record table (stores the running wins and losses of each team)
+    'Records': "CREATE TABLE IF NOT EXISTS Records (team VARCHAR, win INTEGER, loss INTEGER)",
+    'UpcomingGames': "CREATE TABLE IF NOT EXISTS UpcomingGames (team VARCHAR, opponent VARCHAR, \
+             date VARCHAR)",
+    'TeamLeaders': "CREATE TABLE IF NOT EXISTS TeamLeaders (team VARCHAR, name VARCHAR, position VARCHAR, headshot VARCHAR)",
+    'Standings': "CREATE TABLE IF NOT EXISTS Standings (team VARCHAR PRIMARY KEY, standing VARCHAR)",
+    # every game of whole seasons, loaded by seasonIngest.py. Created with the rest so the API can query it before the first ingest
+    'SeasonGames': "CREATE TABLE IF NOT EXISTS SeasonGames (season INTEGER, seasonType VARCHAR, gameKey VARCHAR, \
+            homeTeam VARCHAR, awayTeam VARCHAR, date DATE, doubleheader INTEGER, homeScore INTEGER, \
+            awayScore INTEGER, startTime VARCHAR, PRIMARY KEY (season, gameKey))",
+    # number of committed writes to each table, what the query cache checks its entries against
+    'TableGenerations': "CREATE TABLE IF NOT EXISTS TableGenerations (tableName VARCHAR PRIMARY KEY, generation BIGINT)",
+}
+
+COLUMNS_PLAYERS = ['name', 'position', 'headshotUrl', 'team', 'listings']
+
+# Integer surrogate keys, handed out by _write_rows (idColumn) and kept for as long as the row exists
+ID_COLUMNS = {'Teams': 'teamId', 'Players': 'playerId'}
+
+# ART indexes on the columns the fetch_* queries and the per team writes filter on
+INDEXES = {
+    'Teams': ['teamId'],
+    'Players': ['team', 'name', 'playerId'],
+    'Games': ['homeTeam', 'awayTeam'], # TeamGames filters each side of the view on one of these
+    'Records': ['team'],
+    'UpcomingGames': ['team'],
+    'TeamLeaders': ['team'],
+}
+COLUMNS_GAMES = ['gameId', 'gameKey', 'homeTeam', 'awayTeam', 'date', 'doubleheader', 'homeScore', 'awayScore']
+COLUMNS_RECORDS = ['team', 'win', 'loss']
+COLUMNS_UPCOMING_GAMES = ['team', 'opponent', 'date']
+COLUMNS_TEAM_LEADERS = ['team', 'name', 'position', 'headshot']
+COLUMNS_STANDINGS = ['team', 'standing']
+
+def _create_table(con, table):
+    if table == 'Games':
+        if not _games_table_is_canonical(con):
+            con.sql("DROP TABLE Games") # old one row per team layout, it only held scraped data so it is rebuilt below
+        con.sql(TABLE_SCHEMAS['Games'])
+        # Per team view of Games (team, opponent, won, teamScore, opponentScore), what the API hands out
+        con.sql("CREATE OR REPLACE VIEW TeamGames AS \
+                SELECT gameId, homeTeam AS team, awayTeam AS opponent, date, homeScore > awayScore AS won, \
+                    homeScore AS teamScore, awayScore AS opponentScore, TRUE AS home FROM Games \
+                UNION ALL \
+                SELECT gameId, awayTeam AS team, homeTeam AS opponent, date, awayScore > homeScore AS won, \
+                    awayScore AS teamScore, homeScore AS opponentScore, FALSE AS home FROM Games")
+    else:
+        con.sql(TABLE_SCHEMAS[table])
+    idColumn = ID_COLUMNS.get(table)
+    if idColumn and not con.execute("SELECT 1 FROM information_schema.columns WHERE table_name = ? AND column_name = ?", [table, idColumn]).fetchall():
+        # table from before the integer ids, number the rows already there
+        con.sql(f"ALTER TABLE {table} ADD COLUMN {idColumn} INTEGER")
+        con.sql(f"UPDATE {table} SET {idColumn} = rowid")
+    for column in INDEXES.get(table, []):
+        con.sql(f"CREATE {'UNIQUE ' if column == idColumn else ''}INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+
+def create_tables(con):
+    for table in TABLE_SCHEMAS:
+        _create_table(con, table)
+
+def team_key(name):
+    #'St. Louis Cardinals' (displayName) and 'St Louis Cardinals' (parsed from the opponent link) are the same team
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+def game_key(team, opponent, date, gameNumber=1):
+    #canonical identity of a game, the same no matter which of the two teams' schedules it was read from
+    first, second = sorted((team_key(team), team_key(opponent)))
+    return f"{date}|{first}|{second}|{gameNumber}"
+
+def parse_result(result):
+    #'W5-3' / 'L2-4 F/10' -> (won, teamScore, opponentScore)
+    won = (result[0] == "W")
+    scoring = result[1:].split('-')
+    scores = (int(scoring[0]), int(scoring[1].split(' ')[0])) # We need to do this extra split because 'F/13' is sometimes tacked on the end to indicate that the game had 13 innings
+    # ESPN lists the winning score first, whichever side we're looking from
+    teamScore, opponentScore = (max(scores), min(scores)) if won else (min(scores), max(scores))
+    return won, teamScore, opponentScore
+
+def _games_table_is_canonical(con):
+    columns = con.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'Games'").fetchall()
+    return not columns or ('gameKey',) in columns
+
+def _team_history_rows(team, games_dict, scheduleUrl, mlb_data_dict, displayNames):
+    #turns one team's game_history_five(mlb_data_dict, team, scheduleUrl) output into (record row, {gameKey: game row})
+    games = {}
+    if games_dict and 'user_message' in games_dict[0]:
+        # nothing played on scheduleUrl yet, game_history_five fell back to last season's page
+        games_dict = games_dict[1:]
+        scheduleUrl = mlb_data_dict[team]['lastYearSchedule']
+    if not games_dict or 'record' not in games_dict[0]:
+        return None, games
+
+    # Record formatting
+    recordData = games_dict[0]['record'].split('-')
+    recordTuple = (team, recordData[0], recordData[1])
+
+    year = extract_year(scheduleUrl)
+    curGameList = games_dict[1:]
+    # For loop for formatting
+    for game in curGameList:
+        opponent = displayNames.get(team_key(game['opponent']), game['opponent'])
+        date = datetime.strptime(f"{game['date']} {year}", '%a, %b %d %Y').strftime('%Y-%m-%d')
+        gameNumber = game.get('game number', 1)
+        key = game_key(team, opponent, date, gameNumber)
+
+        won, teamScore, opponentScore = parse_result(game['game result'])
+        if game.get('home', True):
+            games[key] = (None, key, team, opponent, date, gameNumber, teamScore, opponentScore)
+        else:
+            games[key] = (None, key, opponent, team, date, gameNumber, opponentScore, teamScore)
+    return recordTuple, games
 
-mlb_data_dict = get_mlb_team_data(get_mlb_scores())
+def _upcoming_game_row(team, nextGame):
+    if not isinstance(nextGame, dict):
+        return None # no more games this season
+    parsed_date = datetime.strptime(nextGame['date'], '%a, %b %d %I:%M %p %Y')
+    return (team, nextGame['opponent'], parsed_date.strftime(f'%Y-%m-%d'))
 
-def _initialize_teams_table(con):
+def _initialize_teams_table(db=None):
     allTeamData = return_team_list()
-    con.sql("CREATE TABLE IF NOT EXISTS Teams (Logo VARCHAR, teamAbbreviation VARCHAR, \
-            teamUrl VARCHAR, teamSchedule VARCHAR, rosterUrl VARCHAR, \
-            lastYearSchedule VARCHAR, displayName VARCHAR PRIMARY KEY)")
-    num_entries = con.sql("SELECT COUNT(*) FROM Teams").fetchall()[0][0]
-    if num_entries == len(allTeamData):
-        print("Skipped creating teams table")
-        return
-    else:
-        con.sql("DELETE FROM Teams")
+    with writing(db) as con:
+        _create_table(con, 'Teams')
     
-    columns = allTeamData[0].keys()
-    columnNames = ", ".join(columns)
-    placeholders = ", ".join(["?"] * len(columns))
-
-    query = f"INSERT INTO Teams ({columnNames}) VALUES ({placeholders})"
+    columns = list(allTeamData[0].keys())
     values = [tuple(team[col] for col in columns) for team in allTeamData]
 
-    con.executemany(query, values)
+    return _write_rows(db, 'Teams', columns, ['displayName'], values, idColumn='teamId')
 
 
-def _initialize_players_table(con):
-    allPlayers = get_all_players_list(mlb_data_dict)
-    con.sql("CREATE TABLE IF NOT EXISTS Players (name VARCHAR, position VARCHAR, \
-            headshotUrl VARCHAR, team VARCHAR, listings VARCHAR[])")
-    num_entries = con.sql("SELECT COUNT(*) FROM Players").fetchall()[0][0]
-    if num_entries == len(allPlayers):
-        print("Skipped creating players table")
-        return
-    else:
-        con.sql("DELETE FROM Players")
-    
-    columns = ['name', 'position', 'headshotUrl', 'team', 'listings']
-    columnNames = ", ".join(columns)
-    placeholders = ", ".join(["?"] * len(columns))
+def _initialize_players_table(db=None):
+    with writing(db) as con:
+        _create_table(con, 'Players')
 
-    query = f"INSERT INTO Players ({columnNames}) VALUES ({placeholders})"
-    
-    con.executemany(query, allPlayers)
+    return _write_rows(db, 'Players', COLUMNS_PLAYERS, ['name', 'team'], iter_all_players(get_team_registry()), idColumn='playerId')
 
 
-# Initializes the records table, and the games tables with the five most recent games
-def _initialize_games_tables(con):
-    # Games table (only five most recent games of every team)
-    con.sql("CREATE TABLE IF NOT EXISTS Games (gameId INTEGER PRIMARY KEY, team VARCHAR, \
-            opponent VARCHAR, date VARCHAR, won BOOLEAN, teamScore INTEGER, opponentScore INTEGER)")
-    con.sql("DELETE FROM Games")
+def _teams_by_url(mlb_data_dict, teamNames, urlKey):
+    teamsByUrl = {}
+    for team in teamNames:
+        teamsByUrl.setdefault(mlb_data_dict[team][urlKey], []).append(team)
+    return teamsByUrl
 
+def _game_rows(mlb_data_dict, teamNames, records):
+    #schedule pages -> Games rows as each page is parsed, every team's Records row is appended to records on the way
+    displayNames = {team_key(team): team for team in teamNames}
+    teamsByUrl = _teams_by_url(mlb_data_dict, teamNames, 'lastYearSchedule')
+    for url, _ in iter_schedules(teamsByUrl):
+        for team in teamsByUrl[url]:
+            recordTuple, teamGames = _team_history_rows(team, game_history_five(mlb_data_dict, team, url), url, mlb_data_dict, displayNames)
+            if recordTuple:
+                records.append(recordTuple)
+            yield from teamGames.values()
 
-    # Record table (stores the running wins and losses of each team)
-    con.sql("CREATE TABLE IF NOT EXISTS Records (team VARCHAR, win INTEGER, loss INTEGER)")
-    con.sql("DELETE FROM Records")
+# Initializes the records table, and the games tables with the five most recent games
+def _initialize_games_tables(db=None):
+    with writing(db) as con:
+        _create_table(con, 'Games')
+        _create_table(con, 'Records')
 
-    columnsGames = ['gameId', 'team', 'opponent', 'date', 'won', 'teamScore', 'opponentScore']
-    columnsRecords = ['team', 'win', 'loss']
-    gamesList = []
-    recordsList = []
-    gameId = 0
-
-    allTeamNames = map(lambda team: team['displayName'], return_team_list())
-
-    for team in allTeamNames:
-        games_dict = game_history_five(mlb_data_dict, team, mlb_data_dict[team]['lastYearSchedule'])
-
-        # Record formatting
-        recordData = games_dict[0]['record'].split('-')
-        recordTuple = (team, recordData[0], recordData[1])
-        recordsList.append(recordTuple)
-
-        curGameList = games_dict[1:]
-        # For loop for formatting
-        for game in curGameList:
-            game['team'] = team
-            parsed_date = datetime.strptime(game['date'], '%a, %b %d').replace(year=2024)
-            game['date'] = parsed_date.strftime(f'%Y-%m-%d')
-            game['gameId'] = gameId
-            game['won'] = (game['game result'][0] == "W")
-            scoring = game['game result'][1:].split('-')
-            game['teamScore'] = scoring[0]
-            game['opponentScore'] = scoring[1].split(' ')[0] # We need to do this extra split because 'F/13' is sometimes tacked on the end to indicate that the game had 13 innings
-
-            gameTuple = tuple(game[col] for col in columnsGames)
-
-            # Below avoids repeating games
-            # ['gameId', 'team', 'opponent', 'date', 'won', 'team-score', 'opponent-score']
-            if any(tup[1] == gameTuple[2] and tup[3] == gameTuple[3] and tup[5] == gameTuple[6] for tup in gamesList):
-                pass
-            else:
-                gamesList.append(gameTuple)
-                gameId += 1
+    mlb_data_dict = get_team_registry()
+    allTeamNames = list(map(lambda team: team['displayName'], return_team_list()))
 
-    columnNames = ", ".join(columnsGames)
-    placeholders = ", ".join(["?"] * len(columnsGames))
-    query = f"INSERT INTO Games ({columnNames}) VALUES ({placeholders})"
-    con.executemany(query, gamesList)
+    # gameIds are handed out by _write_rows, games we already have keep theirs, a game already written from the other team's schedule is skipped
+    recordsList = []
+    gamesCounts = _write_rows(db, 'Games', COLUMNS_GAMES, ['gameKey'], _game_rows(mlb_data_dict, allTeamNames, recordsList), idColumn='gameId', prune=False)
+    recordsCounts = _write_rows(db, 'Records', COLUMNS_RECORDS, ['team'], recordsList)
+    return gamesCounts, recordsCounts
 
-    columnNames = ", ".join(columnsRecords)
-    placeholders = ", ".join(["?"] * len(columnsRecords))
-    query = f"INSERT INTO Records ({columnNames}) VALUES ({placeholders})"
-    con.executemany(query, recordsList)
 
+def _upcoming_game_rows(mlb_data_dict, teamNames):
+    teamsByUrl = _teams_by_url(mlb_data_dict, teamNames, 'teamSchedule')
+    for url, _ in iter_schedules(teamsByUrl):
+        for team in teamsByUrl[url]:
+            row = _upcoming_game_row(team, next_game_team(mlb_data_dict, team))
+            if row:
+                yield row
 
-def _initialize_upcoming_games_table(con):
+def _initialize_upcoming_games_table(db=None):
     allTeamData = return_team_list()
-    allTeamNames = map(lambda team: team['displayName'], allTeamData)
-    con.sql("CREATE TABLE IF NOT EXISTS UpcomingGames (team VARCHAR, opponent VARCHAR, \
-             date VARCHAR)")
-    num_entries = con.sql("SELECT COUNT(*) FROM UpcomingGames").fetchall()[0][0]
-    if num_entries == len(allTeamData):
-        print("Skipped creating upcoming games table")
-        return
-    else:
-        con.sql("DELETE FROM UpcomingGames")
-
-    upcomingGames = []
-    columns = ['team', 'opponent', 'date']
-    for team in allTeamNames:
-        nextGame = next_game_team(mlb_data_dict, team)
-        parsed_date = datetime.strptime(nextGame['date'], '%a, %b %d %I:%M %p %Y')
-        nextGame['date'] = parsed_date.strftime(f'%Y-%m-%d')
-        nextGame['team'] = team
-        gameTuple = tuple(nextGame[col] for col in columns)
-        upcomingGames.append(gameTuple)
-    
-    columnNames = ", ".join(columns)
-    placeholders = ", ".join(["?"] * len(columns))
+    allTeamNames = list(map(lambda team: team['displayName'], allTeamData))
+    with writing(db) as con:
+        _create_table(con, 'UpcomingGames')
 
-    query = f"INSERT INTO UpcomingGames ({columnNames}) VALUES ({placeholders})"
-    
-    con.executemany(query, upcomingGames)
+    return _write_rows(db, 'UpcomingGames', COLUMNS_UPCOMING_GAMES, ['team'], _upcoming_game_rows(get_team_registry(), allTeamNames))
 
 
-def _initialize_db():
-    with duckdb.connect("database.db") as con:
-        #_initialize_teams_table(con)
-        #_initialize_players_table(con)
-        #_initialize_games_tables(con)
-        _initialize_upcoming_games_table(con)
+'''
+Per team refresh steps used by refreshScheduler.py. scrape_team_* does the network/parsing work and can run on any
+thread, write_team_* takes what it returned and upserts only that team's slice of the tables.
+'''
+def scrape_team_roster(team):
+    return get_team_players_list(get_team_registry(), team)
+
+def write_team_roster(db, team, players):
+    return _write_rows(db, 'Players', COLUMNS_PLAYERS, ['name', 'team'], players, idColumn='playerId', scope=('team', team))
+
+def scrape_team_schedule(team):
+    mlb_data_dict = get_team_registry()
+    displayNames = {team_key(name): name for name in mlb_data_dict}
+    # this season's page, the one that changes on game days (game_history_five falls back to last season before opening day)
+    scheduleUrl = mlb_data_dict[team]['teamSchedule']
+    history = game_history_five(mlb_data_dict, team, scheduleUrl)
+    recordTuple, games = _team_history_rows(team, history, scheduleUrl, mlb_data_dict, displayNames)
+    return recordTuple, games, _upcoming_game_row(team, next_game_team(mlb_data_dict, team))
+
+def write_team_schedule(db, team, scraped):
+    recordTuple, games, upcomingGame = scraped
+    _write_rows(db, 'Games', COLUMNS_GAMES, ['gameKey'], list(games.values()), idColumn='gameId', prune=False)
+    _write_rows(db, 'Records', COLUMNS_RECORDS, ['team'], [recordTuple] if recordTuple else [], scope=('team', team))
+    _write_rows(db, 'UpcomingGames', COLUMNS_UPCOMING_GAMES, ['team'], [upcomingGame] if upcomingGame else [], scope=('team', team))
+
+def scrape_team_leaders(team):
+    leaders, standing = get_team_leaders_dict(get_team_registry(), team)
+    return [(team,) + tuple(leader) for leader in leaders], standing
+
+def write_team_leaders(db, team, scraped):
+    leaders, standing = scraped
+    _write_rows(db, 'TeamLeaders', COLUMNS_TEAM_LEADERS, ['team', 'name'], leaders, scope=('team', team))
+    _write_rows(db, 'Standings', COLUMNS_STANDINGS, ['team'], [(team, standing)] if standing else [], scope=('team', team))
+
+
+def _initialize_db(db=None):
+    # every loader writes into the database in place a batch at a time, the API picks each batch up as it commits
+    #_initialize_teams_table(db)
+    #_initialize_players_table(db)
+    #_initialize_games_tables(db)
+    _initialize_upcoming_games_table(db)
 
 
 def test_db(tables):
@@ -155,64 +437,105 @@ def test_db(tables):
             random_sample = con.sql(f"SELECT * FROM {table} USING SAMPLE 10").fetchall()
             print(f"Random sample of rows:\n{random_sample}\n\n")
 
-def fetch_team(teamName):
-    with duckdb.connect("database.db") as con:
-        query = f"SELECT * FROM Teams WHERE displayName = '{teamName}'"
-        df = con.execute(query).fetchdf()
-        result = df.to_dict(orient="records")
+# Read queries, parameters are bound by DuckDB ($name) instead of formatted into the SQL
+QUERIES = {
+    'team': "SELECT * FROM Teams WHERE displayName = $team",
+    'player': "SELECT * FROM Players WHERE name = $name",
+    'players': "SELECT * FROM Players WHERE team = $team",
+    'playedGames': "SELECT * FROM TeamGames WHERE team = $team ORDER BY date DESC",
+    # a database from before each game was stored once has the old one row per team Games table and no TeamGames view,
+    # _create_table('Games') migrates it the next time the games are loaded
+    'playedGamesOldLayout': "SELECT * FROM Games WHERE team = $team ORDER BY date DESC",
+    'upcomingGames': "SELECT * FROM UpcomingGames WHERE team = $team",
+    'record': "SELECT * FROM Records WHERE team = $team",
+    'teamList': "SELECT * FROM Teams",
+}
+
+# Tables each query reads, a write to one of them drops the query's cached results
+QUERY_TABLES = {
+    'team': ['Teams'],
+    'player': ['Players'],
+    'players': ['Players'],
+    'playedGames': ['Games'],
+    'playedGamesOldLayout': ['Games'],
+    'upcomingGames': ['UpcomingGames'],
+    'record': ['Records'],
+    'teamList': ['Teams'],
+    'gamesInRange': ['SeasonGames'],
+    'headToHead': ['SeasonGames'],
+}
+
+def _fetch_cached(name, params=None):
+    #fetch_dicts(QUERIES[name], params) through the LRU query cache. Results are shared between callers, don't modify them
+    #an entry is only served while the database file and the generations of the tables it reads are the ones it was read at
+    if QUERY_CACHE_SIZE <= 0:
+        return fetch_dicts(QUERIES[name], params)
+    key = (name, tuple(sorted((params or {}).items())))
+    generations = table_generations()
+    stamp = (file_id(), tuple(generations.get(table, 0) for table in QUERY_TABLES[name]))
+    with _query_cache_lock:
+        entry = _query_cache.get(key)
+        if entry and entry[0] == stamp:
+            _query_cache.move_to_end(key)
+            query_cache_stats['hits'] += 1
+            return entry[1]
+        query_cache_stats['misses'] += 1
+    result = fetch_dicts(QUERIES[name], params)
+    with _query_cache_lock:
+        _query_cache[key] = (stamp, result)
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    return result
 
-    return result       
+def fetch_team(teamName):
+    return _fetch_cached('team', {'team': teamName})
 
 def fetch_player(playerName):
-    with duckdb.connect("database.db") as con:
-        query = f"SELECT * FROM Players WHERE name = '{playerName}'"
-        df = con.execute(query).fetchdf()
-        result = df.to_dict(orient="records")
-    
-    for player in result:
-        if isinstance(player['listings'], np.ndarray):
-            player['listings'] = player['listings'].tolist()
-
-    return result
+    return _fetch_cached('player', {'name': playerName})
 
 def fetch_players(teamName):
-    with duckdb.connect("database.db") as con:
-        query = f"SELECT * FROM Players WHERE team = '{teamName}'"
-        df = con.execute(query).fetchdf()
-        result = df.to_dict(orient="records")
-
-    for player in result:
-        if isinstance(player['listings'], np.ndarray):
-            player['listings'] = player['listings'].tolist()
-
-    return result
+    return _fetch_cached('players', {'team': teamName})
 
 def fetch_games(teamName, hasHappened):
-    with duckdb.connect("database.db") as con:
-        query = ""
-        if hasHappened:
-            query = f"SELECT * FROM Games WHERE team = '{teamName}'"
-        else:
-            query = f"SELECT * FROM UpcomingGames WHERE team = '{teamName}'"
-        df = con.execute(query).fetchdf()
-        result = df.to_dict(orient="records")
-
-    return result
+    if hasHappened:
+        try:
+            return _fetch_cached('playedGames', {'team': teamName})
+        except duckdb.CatalogException:
+            return _fetch_cached('playedGamesOldLayout', {'team': teamName})
+    return _fetch_cached('upcomingGames', {'team': teamName})
 
 def fetch_record(teamName):
-    with duckdb.connect("database.db") as con:
-        query = f"SELECT * FROM Records WHERE team = '{teamName}'"
-        df = con.execute(query).fetchdf()
-        result = df.to_dict(orient="records")
-    
-    return result
+    return _fetch_cached('record', {'team': teamName})
+
+# SeasonGames (seasonIngest.py) seen from one team's side, same columns as TeamGames plus the season
+TEAM_SEASON_GAMES = "SELECT season, seasonType, CAST(date AS VARCHAR) AS date, doubleheader, startTime, \
+            CASE WHEN homeTeam = $team THEN awayTeam ELSE homeTeam END AS opponent, \
+            homeTeam = $team AS home, \
+            CASE WHEN homeTeam = $team THEN homeScore ELSE awayScore END AS teamScore, \
+            CASE WHEN homeTeam = $team THEN awayScore ELSE homeScore END AS opponentScore \
+            FROM SeasonGames WHERE (homeTeam = $team OR awayTeam = $team)"
+QUERIES['gamesInRange'] = f"{TEAM_SEASON_GAMES} AND date BETWEEN CAST($start AS DATE) AND CAST($end AS DATE) ORDER BY date, doubleheader"
+QUERIES['headToHead'] = f"{TEAM_SEASON_GAMES} AND (homeTeam = $opponent OR awayTeam = $opponent) \
+            AND ($season IS NULL OR season = $season) ORDER BY date, doubleheader"
+
+def fetch_games_in_range(teamName, start, end):
+    #every game of teamName between start and end (inclusive, 'YYYY-MM-DD'), played or not
+    try:
+        return _fetch_cached('gamesInRange', {'team': teamName, 'start': start, 'end': end})
+    except duckdb.CatalogException:
+        return [] # database from before SeasonGames, nothing ingested yet
+
+def fetch_head_to_head(teamName, opponent, season=None):
+    try:
+        return _fetch_cached('headToHead', {'team': teamName, 'opponent': opponent, 'season': season})
+    except duckdb.CatalogException:
+        return []
 
 def fetch_team_list():
-    with duckdb.connect("database.db") as con:
-        df = con.execute("SELECT * from Teams").fetchdf()
-        result = df.to_dict(orient="records")
-
-    return result
+    return _fetch_cached('teamList')
 
-#_initialize_db()
-#test_db(['Players', 'Teams', 'Games', 'Records', 'UpcomingGames'])
\ No newline at end of file
+if __name__ == "__main__":
+    # the guard keeps the parse pool's workers (which import this file again) from starting a refresh of their own
+    _initialize_db()
+    #test_db(['Players', 'Teams', 'Games', 'Records', 'UpcomingGames'])
@@ -0,0 +1,254 @@
+import duckdb
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+'''
+One DuckDB connection for the whole API process instead of a duckdb.connect() per request. Every thread gets its own
+cursor on it (a DuckDB connection shouldn't be used from two threads at once), so a request only pays for its query.
+
+Every writer writes into DB_PATH in place, one short transaction per batch, through writing(). In a process that
+already has the database open through the manager (the API, with the refresh scheduler running in it) that's a cursor
+on the same connection, and readers see every batch as soon as it commits. DuckDB only lets one process have the file
+open for writing though, so a writer in another process (ingestion, seasonIngest, a standalone scheduler) first
+creates {DB_PATH}.writing. A manager that sees it lets go of the file once its running queries are done, holds new
+queries back until the batch is written and the file is gone, then opens the database again.
+
+Before handing out a cursor we also stat the file, and if it is a different file than the one we opened (it was
+replaced on disk) we close the old connection and open the new one.
+'''
+
+DB_PATH = os.getenv('DUCKDB_PATH', 'database.db')
+MEMORY_LIMIT = os.getenv('DUCKDB_MEMORY_LIMIT', '1GB')
+THREADS = int(os.getenv('DUCKDB_THREADS', '4'))
+# read write so writers in the same process can share the connection, set to 1 for an API that never writes
+READ_ONLY = os.getenv('DUCKDB_READ_ONLY', '0') == '1'
+# seconds a writer waits for the file, or a reader for a writer in another process, before giving up
+LOCK_TIMEOUT = float(os.getenv('DUCKDB_LOCK_TIMEOUT', '60'))
+# seconds between checks while waiting for another process
+POLL = 0.05
+
+def _file_id(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino)
+
+def _intent_path(path):
+    return f"{path}.writing"
+
+def _connect(path, read_only, config, deadline):
+    #duckdb.connect, retried while another process (lock) or a manager in this one (configuration) still has the file open
+    while True:
+        try:
+            return duckdb.connect(path, read_only=read_only, config=config)
+        except (duckdb.IOException, duckdb.ConnectionException) as e:
+            if not ('lock' in str(e) or 'different configuration' in str(e)) or time.monotonic() > deadline:
+                raise
+            time.sleep(POLL)
+
+class ConnectionManager:
+    def __init__(self, path=None, memory_limit=None, threads=None, read_only=None):
+        self.path = path or DB_PATH
+        self.config = {'memory_limit': memory_limit or MEMORY_LIMIT, 'threads': threads or THREADS}
+        self.read_only = READ_ONLY if read_only is None else read_only
+        self._intent = _intent_path(self.path)
+        self._con = None
+        self._fileId = None
+        self._generation = 0
+        self._writes = 0 # writing() blocks through this connection so far
+        self._active = 0 # queries running right now, a reconnect waits for them
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._watcher = None
+
+    def _connect(self):
+        #closing the old connection also closes every cursor made from it, and DuckDB would otherwise hand the old
+        #(replaced) file back to us since it is still open in this process
+        self._disconnect()
+        self._fileId = _file_id(self.path)
+        self._con = _connect(self.path, self.read_only, self.config, time.monotonic() + LOCK_TIMEOUT)
+        self._generation += 1
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch, daemon=True, name='duckdb-intent-watcher')
+            self._watcher.start()
+
+    def _disconnect(self):
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+            self._fileId = None
+            self._generation += 1
+
+    def _watch(self):
+        #an idle API never calls _acquire, so this is what lets go of the file when another process wants to write
+        while True:
+            time.sleep(POLL)
+            with self._cond:
+                if self._con is None:
+                    return # started again by the next _connect
+                if not self._active and os.path.exists(self._intent) and not _clear_stale_intent(self._intent):
+                    self._disconnect()
+                    self._cond.notify_all()
+
+    def _acquire(self):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        with self._cond:
+            while True:
+                if os.path.exists(self._intent):
+                    if _clear_stale_intent(self._intent):
+                        continue
+                    # another process is writing, let go of the file once our queries are done and wait for it
+                    if self._con is not None and not self._active:
+                        self._disconnect()
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"{self._intent} has been held by another writer for {LOCK_TIMEOUT}s")
+                    self._cond.wait(POLL)
+                    continue
+                if self._con is None or _file_id(self.path) != self._fileId:
+                    if self._active:
+                        self._cond.wait() # let the queries on the old file finish first
+                        continue
+                    self._connect()
+                break
+            self._active += 1
+            local = self._local
+            if getattr(local, 'generation', None) != self._generation:
+                local.cursor = self._con.cursor()
+                local.generation = self._generation
+            return local.cursor
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reading(self):
+        #this thread's cursor, the file isn't let go of or swapped out from under it until the block ends (don't nest these)
+        cursor = self._acquire()
+        try:
+            yield cursor
+        finally:
+            self._release()
+
+    @contextmanager
+    def writing(self):
+        #reading() for a block that writes, version() changes once it ends
+        with self.reading() as cursor:
+            try:
+                yield cursor
+            finally:
+                with self._cond:
+                    self._writes += 1
+
+    def version(self):
+        #changes whenever what this process sees of the database may have: a reconnect (another process wrote, or the
+        #file was replaced) or a write through this connection
+        return (self._generation, self._writes)
+
+    def close(self):
+        with self._cond:
+            while self._active:
+                self._cond.wait()
+            self._disconnect()
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_manager():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ConnectionManager()
+    return _manager
+
+def reading():
+    return get_manager().reading()
+
+def file_id():
+    #identifies the database file currently at DB_PATH, changes when the file is replaced
+    return _file_id(get_manager().path)
+
+def version():
+    return get_manager().version()
+
+def fetch_dicts(query, params=None):
+    #rows of query as json ready dicts (column -> python value), params are bound, never formatted into query
+    with reading() as cursor:
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def fetch_arrow(query, params=None):
+    #same as fetch_dicts but as a pyarrow Table, for bulk reads
+    with reading() as cursor:
+        return cursor.execute(query, params).fetch_arrow_table()
+
+def _intent_is_stale(intent):
+    #left behind by a writer that died without cleaning up
+    try:
+        with open(intent) as f:
+            pid = int(f.read() or 0)
+        if not pid:
+            return time.time() - os.path.getmtime(intent) > 5 # still being written, or never got its pid
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except (FileNotFoundError, PermissionError, ValueError):
+        return False
+    return False
+
+def _clear_stale_intent(intent):
+    #removes intent if the writer that made it is gone, returns True when it did (or someone else just had)
+    if not _intent_is_stale(intent):
+        return False
+    try:
+        os.remove(intent)
+    except FileNotFoundError:
+        pass
+    return True
+
+@contextmanager
+def _borrowed(path):
+    #the file opened for this block only, after every manager (in any process) has let go of it
+    intent = _intent_path(path)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(intent, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            # another writer has it, or one that crashed left it behind
+            if _clear_stale_intent(intent):
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{intent} has been held by another writer for {LOCK_TIMEOUT}s")
+            time.sleep(POLL)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        con = _connect(path, False, {'memory_limit': MEMORY_LIMIT, 'threads': THREADS}, deadline)
+        try:
+            yield con
+        finally:
+            con.close()
+    finally:
+        os.remove(intent)
+
+@contextmanager
+def writing(path=None):
+    #a connection for one short batch of writes, commit before the block ends and don't keep it past it. In a process
+    #whose manager has path open read write it's this thread's cursor on that connection, anywhere else the file is
+    #opened for the block only, readers in other processes wait for it to end. Scrape outside the block, not in it
+    path = path or DB_PATH
+    manager = _manager
+    if manager is not None and not manager.read_only and os.path.abspath(manager.path) == os.path.abspath(path):
+        with manager.writing() as cursor:
+            yield cursor
+    else:
+        with _borrowed(path) as con:
+            yield con
@@ -0,0 +1,139 @@
+import json
+import os
+import re
+from datetime import datetime
+import pytz
+from leadersExtractor import Leader
+
+'''
+Readers for ESPN's json endpoints (site.api.espn.com), an alternative to scraping the www.espn.com html pages for
+rosters, schedules, leaders and standings. The payloads are a few KB instead of a few hundred and need no html parser.
+
+Every parse_* function takes the raw bytes of one response and returns plain data, so they can run in the parse pool
+like the html parsers. gamesFromMLB picks between the two per dataset (see SOURCES there).
+'''
+
+API_BASE = os.getenv('ESPN_API_BASE', 'http://site.api.espn.com/apis/site/v2/sports/baseball/mlb')
+
+EST = pytz.timezone('America/New_York')
+SCHEDULE_PAGE_PATTERN = re.compile(r'/name/(\w+)/season/(\d{4})(?:/seasontype/(\d))?')
+
+def teams_url():
+    return f"{API_BASE}/teams"
+
+def team_url(abi):
+    return f"{API_BASE}/teams/{abi}"
+
+def roster_url(abi):
+    return f"{API_BASE}/teams/{abi}/roster"
+
+def leaders_url(abi):
+    return f"{API_BASE}/teams/{abi}/leaders"
+
+def schedule_url(abi, season, seasonType=2):
+    return f"{API_BASE}/teams/{abi}/schedule?season={season}&seasontype={seasonType}"
+
+def schedule_url_from_page(pageUrl):
+    #the json schedule holding the games of a www.espn.com schedule page (teamSchedule, lastYearSchedule, ...)
+    #the json one isn't split into halves, both halves of a regular season map to the same url
+    match = SCHEDULE_PAGE_PATTERN.search(pageUrl)
+    if not match:
+        raise ValueError(f"Not a team schedule page: {pageUrl}")
+    abi, season, seasonType = match.groups()
+    return schedule_url(abi, season, seasonType or 2)
+
+def parse_roster(content):
+    #same shape as gamesFromMLB.parse_roster: {'Pitchers': [(name, position, headshot), ...], ...}
+    players_dict = {}
+    for group in json.loads(content).get('athletes', []):
+        if 'items' not in group:
+            continue
+        players = players_dict.setdefault(group.get('position', '').title(), [])
+        for athlete in group['items']:
+            players.append((athlete.get('displayName') or athlete.get('fullName'),
+                            (athlete.get('position') or {}).get('abbreviation'),
+                            (athlete.get('headshot') or {}).get('href')))
+    return players_dict
+
+def _athletes(node):
+    #every 'athlete' object in the document, in order. The leaders payload nests them under categories whose
+    #layout differs between endpoints, so we don't depend on it
+    if isinstance(node, dict):
+        if isinstance(node.get('athlete'), dict):
+            yield node['athlete']
+        for value in node.values():
+            yield from _athletes(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _athletes(value)
+
+def parse_leaders(content):
+    #same as leadersExtractor.extract_leaders: Leaders in page order, a player can show up once per category
+    leaders = []
+    for athlete in _athletes(json.loads(content).get('leaders', {})):
+        position = athlete.get('position')
+        if isinstance(position, dict):
+            position = position.get('abbreviation')
+        headshot = athlete.get('headshot')
+        if isinstance(headshot, dict):
+            headshot = headshot.get('href')
+        leaders.append(Leader(athlete.get('displayName') or athlete.get('fullName'), position, headshot))
+    return leaders
+
+def parse_standing(content):
+    #e.g. '1st in AL Central', None when ESPN doesn't have one
+    return json.loads(content).get('team', {}).get('standingSummary')
+
+def _score(competitor):
+    score = competitor.get('score')
+    if isinstance(score, dict):
+        score = score.get('value', score.get('displayValue'))
+    return int(float(score)) if score not in (None, '') else None
+
+def _record(competitor):
+    for record in competitor.get('record') or competitor.get('records') or []:
+        if record.get('type', 'total') == 'total':
+            return record.get('displayValue') or record.get('summary')
+    return None
+
+def parse_schedule(content):
+    #returns (year, [game]) where every game is a dict of gamesFromMLB.Game fields, formatted like the html page
+    #('Sun, Sep 29', 'W5-3', '7:05 PM', ...), in the order they are played
+    data = json.loads(content)
+    season = data.get('requestedSeason') or data.get('season') or {}
+    year = str(season['year']) if season.get('year') else None
+    team = data.get('team', {})
+
+    games = []
+    wins = losses = 0
+    for event in data.get('events', []):
+        competition = event['competitions'][0]
+        ours = theirs = None
+        for competitor in competition['competitors']:
+            if competitor.get('id') == team.get('id') or competitor.get('team', {}).get('abbreviation') == team.get('abbreviation'):
+                ours = competitor
+            else:
+                theirs = competitor
+        if ours is None or theirs is None:
+            continue
+        status = competition.get('status', event.get('status', {})).get('type', {})
+        start = datetime.strptime(event['date'], '%Y-%m-%dT%H:%MZ').replace(tzinfo=pytz.utc).astimezone(EST)
+        game = {'date': f"{start:%a, %b} {start.day}", 'opponent': theirs['team']['displayName'], 'result': None,
+                'record': None, 'time': None, 'timestamp': None, 'home': ours.get('homeAway') == 'home'}
+
+        if status.get('completed'):
+            ourScore, theirScore = _score(ours), _score(theirs)
+            if ourScore is None or theirScore is None:
+                continue
+            won = ours.get('winner', ourScore > theirScore)
+            wins, losses = wins + won, losses + (not won)
+            # winning score first, like the html page
+            game['result'] = f"{'W' if won else 'L'}{max(ourScore, theirScore)}-{min(ourScore, theirScore)}"
+            game['record'] = _record(ours) or f"{wins}-{losses}"
+        elif status.get('state') == 'pre' and status.get('name') != 'STATUS_POSTPONED':
+            game['time'] = start.strftime('%I:%M %p').lstrip('0')
+            game['timestamp'] = start.timestamp()
+        else:
+            continue # postponed, suspended, in progress
+        games.append(game)
+    return year, games
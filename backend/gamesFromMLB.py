@@ -1,11 +1,19 @@
-import requests
 import json
 from bs4 import BeautifulSoup
-import pandas as pd
 import time
 from datetime import datetime
 import re
+import os
+import sys
 import pytz
+import threading
+import multiprocessing
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pageCache import fetch_page
+from leadersExtractor import extract_leaders, extract_standing
+import scrapeSession
+import espnApi
 
 #https://gist.github.com/akeaswaran/b48b02f1c94f873c6655e7129910fc3b
 
@@ -14,9 +22,13 @@ import pytz
 Data set for more updated information, (like recent insights and shit). What soft knowledge do we need?
 Maybe just use ChatGPT (OpenAI) for open knowledge
 '''
+# Where each dataset is read from: 'html' scrapes the www.espn.com pages, 'json' uses ESPN's json api (espnApi.py)
+# e.g. ESPN_SCHEDULE_SOURCE=json
+SOURCES = {dataset: os.getenv(f"ESPN_{dataset.upper()}_SOURCE", 'html') for dataset in ('roster', 'schedule', 'leaders', 'standing')}
+
 def get_mlb_scores():
-    url = "http://site.api.espn.com/apis/site/v2/sports/baseball/mlb/teams"
-    response = requests.get(url)
+    url = espnApi.teams_url()
+    response = scrapeSession.get(url)
     if response.status_code == 200:
         data = response.json()
         return data
@@ -54,79 +66,53 @@ def get_mlb_team_data(data):
     return retDict
     
 def get_team_leaders_dict(mlb_data_dict, team):
-    #can definitelty make this function more efficient
-    #returns dictionary of best players on team info, and the ranking of the team in it's region
-    url = mlb_data_dict[team]['teamUrl']
-    
-    # Send GET request and get the page content
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    response = requests.get(url, headers=headers)
-    
-    # Parse the HTML content
-    
-    soup = BeautifulSoup(response.content, 'html.parser')
-    script_tags = soup.find_all('script')
-    ret = None
-
-    
-    for i in range(len(script_tags)):
-        for string in script_tags[i].stripped_strings:
-            d = repr(string)
-            if 'teamLeaders' in d:
-                ret = d
-            
-    
-    firstIdx = ret.find('teamLeaders')
-    teamleaderInfo = ret[firstIdx + 13:]
-    secondIdx = teamleaderInfo.find("dictionary")
-    teamleaderInfoNew = teamleaderInfo[:secondIdx - 2]
-    teamleaderInfoNew = remove_backslashes(teamleaderInfoNew.strip())
-    teamleaderInfoParse = json.loads(teamleaderInfoNew)
-    leadersParse = teamleaderInfoParse['leaders']
-    
-    standing_tag = soup.find_all('li')
-    standing = None
-    for i in range(len(standing_tag)):
-        for string in standing_tag[i].stripped_strings:
-            d = repr(string)
-            if 'NL ' in d or 'AL ' in d:
-                standing = d
-                
+    #returns list of best players on team info (Leaders), and the ranking of the team in it's region
+    abi = mlb_data_dict[team]['teamAbbreviation']
+    content = None
+    if 'html' in (SOURCES['leaders'], SOURCES['standing']):
+        # Send GET request and get the page content, leaders and standing are both on the team stats page
+        content = fetch_page(mlb_data_dict[team]['teamUrl'])
 
-
-    return (leadersParse, standing)
-
-    #bs4 element tag
+    if SOURCES['leaders'] == 'json':
+        leaders = espnApi.parse_leaders(fetch_page(espnApi.leaders_url(abi)))
+    else:
+        leaders = extract_leaders(content)
+    if SOURCES['standing'] == 'json':
+        standing = espnApi.parse_standing(fetch_page(espnApi.team_url(abi)))
+    else:
+        standing = extract_standing(content)
+    return leaders, standing
 
 def get_team_leaders(list):
     #returns list of best players with mugshot
     newAthletes = set()
     newAthleteInfo = []
     for athlete in list:
-        newAddition = athlete['athlete']['name']
-        newHeadshot = athlete['athlete']['headshot']
-        newPosition = athlete['athlete']['position']
-        if newAddition not in newAthletes:
-            newAthletes.add(newAddition)
-            newAthleteInfo.append((newAddition, newPosition, newHeadshot))
+        if athlete.name not in newAthletes:
+            newAthletes.add(athlete.name)
+            newAthleteInfo.append(athlete)
     return newAthleteInfo
 
-def get_all_players(mlb_data_dict, team): #return a dictionary of list, similar to above, except the key is either Pitchers, Catchers, Infielders, or Outfielders
-    url = mlb_data_dict[team]['rosterUrl']
+def roster_page(teamInfo):
+    #(url, parse function) of the page a team's roster is read from, depends on SOURCES['roster']
+    if SOURCES['roster'] == 'json':
+        return espnApi.roster_url(teamInfo['teamAbbreviation']), espnApi.parse_roster
+    return teamInfo['rosterUrl'], parse_roster
 
-    players_dict = {}
+def get_all_players(mlb_data_dict, team): #return a dictionary of list, similar to above, except the key is either Pitchers, Catchers, Infielders, or Outfielders
+    url, parse = roster_page(mlb_data_dict[team])
 
     # Send GET request and get the page content
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    response = requests.get(url, headers=headers)
-    
-    # Parse the HTML content
+    content = fetch_page(url)
+
+    return parse(content)
+
+def parse_roster(content):
+    #roster page html -> {'Pitchers': [(name, position, headshot), ...], ...}
+    #top level and only returns plain tuples so it can run in the parse pool
+    players_dict = {}
     
-    roster_soup = BeautifulSoup(response.content, 'html.parser')
+    roster_soup = BeautifulSoup(content, 'html.parser')
 
     positions_tables = roster_soup.find_all('div', class_='ResponsiveTable')
 
@@ -136,16 +122,17 @@ def get_all_players(mlb_data_dict, team): #return a dictionary of list, similar
         group = table.find('div', class_='Table__Title') #Pitchers, Catchers, Infielders, or Outfielders
         if not group:
             continue
-        player_rows = roster_soup.find_all('tr', class_='Table__TR')
+        player_rows = table.find_all('tr', class_='Table__TR') #only this table's rows, each table is parsed once
+        players = players_dict.setdefault(group.text, [])
         
-        for table in player_rows:
+        for row in player_rows:
             name = None
             position = None
             headshot = None
             
-            line = table.find('div')
+            line = row.find('div')
             
-            position_line = table.find_all('td')
+            position_line = row.find_all('td')
            
             if position_line:
                 position = position_line[2].find('div').text
@@ -156,11 +143,7 @@ def get_all_players(mlb_data_dict, team): #return a dictionary of list, similar
 
             if not name:
                 continue
-            player_info = (name, position, headshot)
-            if group.text not in players_dict:
-                players_dict[group.text] = [player_info]
-            else:
-                players_dict[group.text].append(player_info)
+            players.append((name, position, headshot))
     return players_dict #similar return as function above, but it is a dictionary, telling us if they are a pitcher, infielder, outfielder or catcher
 
 '''
@@ -170,143 +153,297 @@ CANT PROMISE THAT THESE TWO FUNCTIONS WORK AS INTENDED, WE DONT KNOW WHAT THE PA
 def extract_year(url): #say we are in december, the next game is in febuary. Thus cannot take the current year.
     year_match = re.search(r'(\d{4})', url)
     return year_match.group(1) if year_match else None
-def next_game_team(dict, team): #returns the date and opponent of the next scheduled game. takes in team full name. #IGNORING TIMEZONES FOR NOW (time zones don't matter, compare it to local time in EST all the time, cuz thats where the API request is coming from)
-    
-    scheduleUrl = dict[team]['teamSchedule']
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-
-    i = 1
-    response = requests.get(scheduleUrl, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    while True:
-        row = soup.find('tr', attrs={'data-idx': f'{i}'})
-        if not row:
-            break
+
+EST = pytz.timezone('America/New_York')
+RESULT_PATTERN = re.compile(r'^[WLT]\d+-\d+')
+
+class Game(NamedTuple):
+    date: str # as shown on ESPN, e.g. 'Sun, Sep 29'
+    opponent: str
+    result: Optional[str] # e.g. 'W5-3' or 'L2-4 F/10', None if the game hasn't been played
+    record: Optional[str] # team's W-L record after this game, None if the game hasn't been played
+    time: Optional[str] # start time in EST for upcoming games, e.g. '7:05 PM'
+    timestamp: Optional[float] # start time of upcoming games as a unix timestamp
+    home: bool = True # False when ESPN shows '@' in front of the opponent
+    game_number: int = 1 # 2 for the second game of a doubleheader
+
+class Schedule:
+    #one team schedule page parsed in a single pass into a list of Games, in the order they are played
+    def __init__(self, content):
+        soup = BeautifulSoup(content, 'html.parser')
+        self.year = extract_year(repr(soup.find('title')))
+        games = []
+        for row in soup.find_all('tr', attrs={'data-idx': True}):
+            game = self._parse_row(row)
+            if game:
+                games.append(game)
+        self._index(games)
+
+    @classmethod
+    def from_games(cls, year, games):
+        #a Schedule built from already parsed Games (the json api) instead of a schedule page
+        schedule = cls.__new__(cls)
+        schedule.year = year
+        schedule._index(games)
+        return schedule
+
+    def _index(self, games):
+        self.games = games
+        seen = {}
+        for i, game in enumerate(self.games):
+            seen[(game.date, game.opponent)] = seen.get((game.date, game.opponent), 0) + 1
+            if seen[(game.date, game.opponent)] > 1:
+                self.games[i] = game._replace(game_number=seen[(game.date, game.opponent)])
+        self.played = [game for game in self.games if game.result]
+        self.upcoming = [game for game in self.games if game.timestamp is not None]
+
+    def _parse_row(self, row):
         tableinfo = row.find_all('td', class_='Table__TD')
-        time = tableinfo[2].text.strip()
-        if time.find('-') != -1:
-            i += 1
-            continue
-        
-        year = extract_year(repr(soup.find('title')))
-        
-        date = row.find('td', class_='Table__TD').text.strip()
-        
-        est = pytz.timezone('America/New_York')
-        time_now = datetime.now(est).timestamp()
-        date_time_str = f"{date} {time} {year}"
-        gametime = est.localize(datetime.strptime(date_time_str, '%a, %b %d %I:%M %p %Y')).timestamp()
-        if time_now < gametime:
-            break
-        i += 1
-    
-    if row:
+        if len(tableinfo) < 3:
+            return None
         partition = row.find('div', class_='flex items-center opponent-logo')
-        opponent_url = partition.find_all('span')[-1].find('a', class_='AnchorLink')['href']
-            
+        if not partition:
+            return None #header and month separator rows don't have an opponent
+        spans = partition.find_all('span')
+        anchor = spans[-1].find('a', class_='AnchorLink')
+        if not anchor:
+            return None
+        home = spans[0].text.strip() != '@'
+        opponent_url = anchor['href']
         opponent = opponent_url[opponent_url.rfind('/') + 1:].replace('-', ' ').title()
-        opponent_str = f"{opponent}"
-    
-    if date_time_str and opponent_str:
-        return {'date': date_time_str, 'opponent': opponent_str}
-    else:
-        return "There are no more games this season"
+        date = tableinfo[0].text.strip()
+        third = tableinfo[2].text.strip()
+
+        if RESULT_PATTERN.match(third):
+            record = tableinfo[3].text.strip() if len(tableinfo) > 3 else None
+            return Game(date, opponent, third, record, None, None, home)
+        try:
+            gametime = EST.localize(datetime.strptime(f"{date} {third} {self.year}", '%a, %b %d %I:%M %p %Y')).timestamp()
+        except ValueError:
+            return None #postponed, TBD, etc.
+        return Game(date, opponent, None, None, third, gametime, home)
+
+    def record(self):
+        #W-L record after the most recent played game
+        return self.played[-1].record if self.played else None
+
+    def last_games(self, n):
+        #the n most recently played games, most recent first
+        return self.played[::-1][:n]
+
+    def next_game(self, now=None):
+        now = now if now is not None else datetime.now(EST).timestamp()
+        for game in self.upcoming:
+            if now < game.timestamp:
+                return game
+        return None
+
+SEASON_TYPES = {'regular': 2, 'postseason': 3}
+
+def season_schedule_urls(abi, season):
+    #every schedule page of one team's season as (seasonType, url), ESPN splits the regular season into two halves
+    base = f"https://www.espn.com/mlb/team/schedule/_/name/{abi}/season/{season}/seasontype"
+    return [('regular', f"{base}/{SEASON_TYPES['regular']}/half/1"),
+            ('regular', f"{base}/{SEASON_TYPES['regular']}/half/2"),
+            ('postseason', f"{base}/{SEASON_TYPES['postseason']}")]
+
+_schedule_cache = {}
+_schedule_cache_lock = threading.Lock()
+
+def parse_schedule_json(content):
+    year, games = espnApi.parse_schedule(content)
+    return Schedule.from_games(year, [Game(**game) for game in games])
 
+def schedule_page(scheduleUrl):
+    #(url, parse function) the schedule behind a www.espn.com schedule url is read from, depends on SOURCES['schedule']
+    if SOURCES['schedule'] == 'json':
+        return espnApi.schedule_url_from_page(scheduleUrl), parse_schedule_json
+    return scheduleUrl, Schedule
 
+def get_schedule(scheduleUrl):
+    #parsed Schedule for a url, only re-parsed when the page itself changed
+    pageUrl, parse = schedule_page(scheduleUrl)
+    content = fetch_page(pageUrl)
+    with _schedule_cache_lock:
+        cached = _schedule_cache.get(scheduleUrl)
+    if cached and cached[0] == content:
+        return cached[1]
+    schedule = parse(content)
+    with _schedule_cache_lock:
+        _schedule_cache[scheduleUrl] = (content, schedule)
+    return schedule
+
+def next_game_team(dict, team): #returns the date and opponent of the next scheduled game. takes in team full name. #IGNORING TIMEZONES FOR NOW (time zones don't matter, compare it to local time in EST all the time, cuz thats where the API request is coming from)
+    schedule = get_schedule(dict[team]['teamSchedule'])
+    game = schedule.next_game()
+    if not game:
+        return "There are no more games this season"
+    return {'date': f"{game.date} {game.time} {schedule.year}", 'opponent': game.opponent}
 
 def game_history_five(dict, team, scheduleUrl): #current win-lost record and outputs history of last 5 games history, with time in EST. If none for this season, gets last season and puts a user message before information stated.
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    schedule = get_schedule(scheduleUrl)
     game_history = []
-    i = 1
-    response = requests.get(scheduleUrl, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    while True:
-        row = soup.find('tr', attrs={'data-idx': f'{i}'})
-        if not row:
-            break
-        date = row.find('td', class_='Table__TD').text.strip()
-        part = row.find_all('td', class_='Table__TD')
-        if len(part) < 3:
-            break
-        time = part[2].text.strip()
-        if time.find('-') != -1 or date.find('Postponed'):
-            i += 1
-            continue
-        year = extract_year(repr(soup.find('title')))
-        est = pytz.timezone('America/New_York')
-        time_now = datetime.now(est).timestamp()
-        date_time_str = f"{date} {time} {year}"
-        
-        gametime = est.localize(datetime.strptime(date_time_str, '%a, %b %d %I:%M %p %Y')).timestamp()
-        if time_now < gametime:
-            break
-        i += 1
-    if not row and i != 1:
-        newrow = soup.find('tr', attrs = {'data-idx': f'{i - 1}'})
-        
-        tableinfo = newrow.find_all('td', class_='Table__TD')
-        W_L_record = tableinfo[3].text.strip()
-        game_history.append({'record': W_L_record})
-        k = 1
-        while i > k:
-            result = f"{tableinfo[2].text.strip()}"
-            if not newrow:
-                continue
-            partition = newrow.find('div', class_='flex items-center opponent-logo')
-            if not partition:
-                k += 1
-                newrow = soup.find('tr', attrs={'data-idx': f'{i - k}'})
-                continue
-            print()
-            opponent_url = partition.find_all('span')[-1].find('a', class_='AnchorLink')['href']
-            
-            opponent = opponent_url[opponent_url.rfind('/') + 1:].replace('-', ' ').title()
-            date = f"{tableinfo[0].text.strip()}"
-            game_history.append({'opponent': opponent, 'game result': result, 'date': date})
-            if k == 5: 
-                break
-            k += 1
-            newrow = soup.find('tr', attrs={'data-idx': f'{i - k}'})
-            tableinfo = newrow.find_all('td', class_='Table__TD')
-    if not game_history: #maybe return the record from last season?
-        #print("There are no played games this season, pulling up last season history (appending this message to beginning of new_history list)")
+    if schedule.played:
+        game_history.append({'record': schedule.record()})
+        for game in schedule.last_games(5):
+            game_history.append({'opponent': game.opponent, 'game result': game.result, 'date': game.date, 'home': game.home, 'game number': game.game_number})
+    if not game_history and scheduleUrl != dict[team]['lastYearSchedule']: #maybe return the record from last season?
         game_history = game_history_five(dict, team, dict[team]['lastYearSchedule'])
         game_history.insert(0, {'user_message': "There are no played games this season, pulling up last season history"})
     return game_history
 
+_team_registry = None
+_team_registry_lock = threading.Lock()
+
+def get_team_registry(refresh=False):
+    #dictionary of all mlb teams (get_mlb_team_data), only fetched from ESPN the first time someone asks for it
+    global _team_registry
+    if _team_registry is None or refresh:
+        with _team_registry_lock:
+            if _team_registry is None or refresh:
+                _team_registry = get_mlb_team_data(get_mlb_scores())
+    return _team_registry
+
+def warm_up():
+    #call this before serving traffic so the first request doesn't pay for the team registry fetch
+    return get_team_registry()
+
 def return_team_list():
-    data = get_mlb_scores()
-    data_dict = get_mlb_team_data(data)
-    for key in data_dict.keys():
-        data_dict[key]['displayName'] = key
-    team_data_list = [value for value in data_dict.values()]
-    return team_data_list
-
-LISTINGS = ['Pitchers', 'Catchers', 'Infielders']
+    return [dict(value) for value in get_team_registry().values()]
+
+# Max number of ESPN pages we have in flight at once during a full refresh
+MAX_IN_FLIGHT = int(os.getenv('SCRAPE_MAX_IN_FLIGHT', '8'))
+
+def scrape_concurrently(func, items, max_in_flight=None):
+    #calls func on every item using a thread pool, so a full refresh takes about as long as the slowest page instead of the sum of all of them
+    #results come back in the same order as items
+    items = list(items)
+    if not items:
+        return []
+    workers = min(max_in_flight or MAX_IN_FLIGHT, len(items))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+# Number of processes parsing html during a full refresh. BeautifulSoup holds the GIL, so parsing in the fetch threads
+# never uses more than one core. 0 or 1 parses on the calling thread instead.
+PARSE_WORKERS = int(os.getenv('SCRAPE_PARSE_WORKERS', str(os.cpu_count() or 1)))
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+_main_guard = re.compile(r"""^if\s+__name__\s*==\s*['"]__main__['"]\s*:""", re.M)
+_main_is_safe = None
+
+def main_is_import_safe():
+    #spawn runs the main script again in every parse worker. That's only harmless when the script does its work under
+    #if __name__ == "__main__": (like seasonIngest.py and refreshScheduler.py), a script that scrapes at module level
+    #would start the whole scrape again in each worker and break the pool
+    global _main_is_safe
+    if _main_is_safe is None:
+        path = getattr(sys.modules.get('__main__'), '__file__', None)
+        if path is None:
+            _main_is_safe = True # interactive or python -c, there's nothing for spawn to run again
+        else:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    _main_is_safe = bool(_main_guard.search(f.read()))
+            except OSError:
+                _main_is_safe = False
+    return _main_is_safe
+
+def get_parse_pool():
+    global _parse_pool
+    if _parse_pool is None:
+        with _parse_pool_lock:
+            if _parse_pool is None:
+                # spawn instead of fork, the pool is started while fetch threads may be holding locks
+                _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _parse_pool
+
+def fetch_and_parse(urls, parse, max_in_flight=None):
+    #two stage pipeline: threads download the pages, the parse pool runs parse(content) on them
+    #parse has to be a top level function (it gets pickled) that returns plain data
+    #yields (url, content, parsed) as soon as each page is parsed, so not in the order of urls
+    #the script that's running has to keep its work under if __name__ == "__main__":, otherwise pages are parsed on
+    #this thread (see main_is_import_safe)
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return
+    parsePool = None
+    if PARSE_WORKERS > 1:
+        if main_is_import_safe():
+            parsePool = get_parse_pool()
+        else:
+            print(f"{sys.modules['__main__'].__file__} has no if __name__ == \"__main__\": guard, parsing without the parse pool")
+    workers = min(max_in_flight or MAX_IN_FLIGHT, len(urls))
+    with ThreadPoolExecutor(max_workers=workers) as fetchPool:
+        fetches = {fetchPool.submit(fetch_page, url): url for url in urls}
+        parses = {}
+        pending = set(fetches)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    url = fetches.pop(future)
+                    content = future.result()
+                    if parsePool is None:
+                        yield url, content, parse(content)
+                        continue
+                    parsed = parsePool.submit(parse, content)
+                    parses[parsed] = (url, content)
+                    pending.add(parsed)
+                else:
+                    url, content = parses.pop(future)
+                    yield url, content, future.result()
+
+def iter_schedules(urls, max_in_flight=None):
+    #fetches and parses many schedule pages through the pipeline and puts them in the get_schedule cache
+    #yields (url, Schedule) as each page is parsed
+    pages = {} # page url -> schedule urls it holds, more than one when the json api doesn't split the season in halves
+    parse = Schedule
+    for url in urls:
+        pageUrl, parse = schedule_page(url)
+        pages.setdefault(pageUrl, []).append(url)
+    for pageUrl, content, schedule in fetch_and_parse(pages, parse, max_in_flight):
+        for url in pages[pageUrl]:
+            with _schedule_cache_lock:
+                _schedule_cache[url] = (content, schedule)
+            yield url, schedule
+
+def prefetch_schedules(urls, max_in_flight=None):
+    #returns {url: Schedule}
+    return dict(iter_schedules(urls, max_in_flight))
+
+LISTINGS = ['Pitchers', 'Catchers', 'Infielders', 'Outfielders']
+def _merge_listings(teamName, playerDict):
+    allPlayers = {} # name -> player tuple, so merging listings is a dict lookup instead of a scan
+    for listing in LISTINGS:
+        for name, position, headshot in playerDict.get(listing, []):
+            curPlayer = allPlayers.get(name)
+            if curPlayer is None:
+                allPlayers[name] = (name, position, headshot, teamName, [listing])
+            elif listing not in curPlayer[4]:
+                curPlayer[4].append(listing)
+    return list(allPlayers.values())
+
+def get_team_players_list(MLBdata, teamName):
+    #one team's (name, position, headshot, team, listings) tuples, what get_all_players_list returns for every team
+    return _merge_listings(teamName, get_all_players(MLBdata, teamName))
+
+def iter_all_players(MLBdata, teamNames=None):
+    #yields one (name, position, headshot, team, listings) tuple per player on a team, a whole team at a time as soon as its roster page is parsed
+    teamNames = teamNames or list(map(lambda team: team['displayName'], return_team_list()))
+    teamsByUrl = {}
+    parse = parse_roster
+    for team in teamNames:
+        url, parse = roster_page(MLBdata[team])
+        teamsByUrl[url] = team
+    for url, _, playerDict in fetch_and_parse(teamsByUrl, parse):
+        yield from _merge_listings(teamsByUrl[url], playerDict)
+
 def get_all_players_list(MLBdata):
-    allTeamNames = map(lambda team: team['displayName'], return_team_list())
-    allPlayers = []
-    for teamName in allTeamNames:
-        playerDict = get_all_players(MLBdata, teamName)
-        for listing in LISTINGS:
-            curPlayerList = playerDict[listing]
-            curPlayerList = map(lambda curPlayer: curPlayer + (teamName, [listing],), curPlayerList)
-            for curPlayer in curPlayerList:
-                if curPlayer in allPlayers:
-                    existingListings = allPlayers[curPlayer][4]
-                    curPlayer = curPlayer[:4] + (existingListings + curPlayer[4],)
-                allPlayers.append(curPlayer)
-    return allPlayers
-
-data = get_mlb_scores() #this is all mlb data
-mlb_dict = get_mlb_team_data(data) #gives us a dictionary request of all mlb data
-team = 'Kansas City Royals'
+    #returns one (name, position, headshot, team, listings) tuple per player on a team, players listed under more than one group get all of them in listings
+    return list(iter_all_players(MLBdata))
 
 #teamNames = map(lambda team: team['displayName'], return_team_list())
-#get_all_players(mlb_dict, "Chicago Cubs")
+#get_all_players(get_team_registry(), "Chicago Cubs")
@@ -5,19 +5,6 @@ from nba_api.stats.endpoints import leaguestandings
 '''
 Most likely what we would use. No underdog data. More for past information.
 '''
-# Nikola Jokić
-#players.findplayersbyname
-career = playercareerstats.PlayerCareerStats(player_id='203999')
-
-# pandas data frames (optional: pip install pandas)
-career.get_data_frames()[0]
-
-# json
-career.get_json()
-
-# dictionary
-print(career.get_data_frames()[0])
-
 def get_season_games(season):
     gamefinder = leaguegamefinder.LeagueGameFinder(
         season_nullable=season,
@@ -26,6 +13,20 @@ def get_season_games(season):
     games = gamefinder.get_data_frames()[0]
     return games
 
-#1990-91 season
-season_games = get_season_games('2024-25')
-print(season_games)
\ No newline at end of file
+if __name__ == '__main__':
+    # Nikola Jokić
+    #players.findplayersbyname
+    career = playercareerstats.PlayerCareerStats(player_id='203999')
+
+    # pandas data frames (optional: pip install pandas)
+    career.get_data_frames()[0]
+
+    # json
+    career.get_json()
+
+    # dictionary
+    print(career.get_data_frames()[0])
+
+    #1990-91 season
+    season_games = get_season_games('2024-25')
+    print(season_games)
@@ -1,5 +1,5 @@
-import requests
 import json
+import scrapeSession
 #https://gist.github.com/akeaswaran/b48b02f1c94f873c6655e7129910fc3b
 
 
@@ -9,7 +9,7 @@ Maybe just use ChatGPT (OpenAI) for open knowledge
 '''
 def get_nba_scores():
     url = "http://site.api.espn.com/apis/site/v2/sports/basketball/nba/scoreboard"
-    response = requests.get(url)
+    response = scrapeSession.get(url)
     
     if response.status_code == 200:
         data = response.json()
@@ -25,5 +25,6 @@ def print_scores(data):
     print(data.keys())
 
 
-scores = get_nba_scores()
-print_scores(scores)
+if __name__ == '__main__':
+    scores = get_nba_scores()
+    print_scores(scores)
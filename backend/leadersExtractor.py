@@ -0,0 +1,98 @@
+import html
+import json
+import os
+import re
+from typing import NamedTuple, Optional
+
+'''
+Pulls the team leaders and the division standing out of an ESPN team stats page without building a soup of the
+whole document. The leaders live in the page's embedded json state, so we find the "teamLeaders" key with one
+scan of the raw bytes and let the json decoder read exactly that object.
+'''
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser # selectolax < 1.0
+    except ImportError:
+        HTMLParser = None
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# How the standing <li> is found: 'regex' scans the raw bytes (fastest, no dependencies), 'selectolax' or 'lxml'
+# use a real html parser if one is installed, for when the markup gets too odd for the regex
+STANDING_BACKEND = os.getenv('STANDING_BACKEND', 'regex')
+
+TEAM_LEADERS_KEY = b'"teamLeaders":'
+LI_PATTERN = re.compile(rb'<li\b[^>]*>(.*?)</li>', re.S)
+TEXT_PATTERN = re.compile(rb'>([^<]+)')
+
+_decoder = json.JSONDecoder()
+
+class Leader(NamedTuple):
+    name: str
+    position: str
+    headshot: Optional[str]
+
+def extract_leaders(content):
+    #returns the list of Leaders in page order (a player can show up once per stat category)
+    idx = content.find(TEAM_LEADERS_KEY)
+    if idx == -1:
+        return []
+    text = content[idx + len(TEAM_LEADERS_KEY):].decode('utf-8', errors='replace')
+    teamLeaders, _ = _decoder.raw_decode(text.lstrip())
+    leaders = []
+    for leader in teamLeaders.get('leaders', []):
+        athlete = leader['athlete']
+        leaders.append(Leader(athlete['name'], athlete['position'], athlete.get('headshot')))
+    return leaders
+
+def _is_standing(string):
+    return 'NL ' in string or 'AL ' in string
+
+def _standing_regex(content, first=False):
+    standing = None
+    for li in LI_PATTERN.finditer(content):
+        for string in TEXT_PATTERN.findall(b'>' + li.group(1)):
+            string = html.unescape(string.decode('utf-8', errors='replace')).strip()
+            if string and _is_standing(string):
+                if first:
+                    return string
+                standing = string
+    return standing
+
+def _standing_selectolax(content, first=False):
+    standing = None
+    for li in HTMLParser(content).css('li'):
+        for string in li.text(separator='\n', strip=True).split('\n'):
+            if _is_standing(string):
+                if first:
+                    return string
+                standing = string
+    return standing
+
+def _standing_lxml(content, first=False):
+    standing = None
+    for li in lxml.html.fromstring(content).iter('li'):
+        for string in li.itertext():
+            string = string.strip()
+            if string and _is_standing(string):
+                if first:
+                    return string
+                standing = string
+    return standing
+
+def extract_standing(content, backend=None, first=False):
+    #the last list item that mentions the league, e.g. '1st in AL Central', or the first one with first=True
+    backend = backend or STANDING_BACKEND
+    if backend == 'selectolax' and HTMLParser:
+        return _standing_selectolax(content, first)
+    if backend == 'lxml' and lxml:
+        return _standing_lxml(content, first)
+    return _standing_regex(content, first)
+
+def extract_team_page(content, backend=None):
+    return extract_leaders(content), extract_standing(content, backend)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+import scrapeSession
+import scrapeFixtures
+
+'''
+On-disk cache for the ESPN html pages we scrape. Bodies are kept on disk next to a small json file with the
+ETag/Last-Modified headers, so once an entry is past its TTL we revalidate with a conditional GET instead of
+downloading the whole page again.
+'''
+
+CACHE_DIR = os.getenv('ESPN_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.espn_cache'))
+
+# How long (in seconds) a cached page is served without asking ESPN again. FOREVER means never revalidate.
+ROSTER_TTL = 24 * 60 * 60
+SCHEDULE_TTL = 5 * 60
+TEAM_PAGE_TTL = 60 * 60
+FOREVER = None
+
+def season_end(season):
+    #the postseason is over by the new year, a schedule downloaded after this has every game of the season in it
+    return datetime(season + 1, 1, 1).timestamp()
+
+def page_ttl(url, fetchedAt=None):
+    #picks the TTL from the kind of page the url points at, fetchedAt is when the cached copy was downloaded
+    if '/roster' in url:
+        return ROSTER_TTL
+    if '/schedule' in url:
+        season = re.search(r'season[/=](\d{4})', url) # html page or json api url
+        if season and fetchedAt is not None and fetchedAt >= season_end(int(season.group(1))):
+            return FOREVER #copy of a season that was already over (lastYearSchedule), it doesn't change anymore
+        return SCHEDULE_TTL
+    return TEAM_PAGE_TTL
+
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{key}.html"), os.path.join(CACHE_DIR, f"{key}.json")
+
+def _read_entry(url):
+    bodyPath, metaPath = _cache_paths(url)
+    try:
+        with open(metaPath, 'r') as f:
+            meta = json.load(f)
+        with open(bodyPath, 'rb') as f:
+            body = f.read()
+    except (FileNotFoundError, ValueError):
+        return None, None
+    return body, meta
+
+def _write_entry(url, body, meta):
+    #write to a temp file and rename so a concurrent reader never sees half a page
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    bodyPath, metaPath = _cache_paths(url)
+    if body is not None:
+        tmpPath = f"{bodyPath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmpPath, 'wb') as f:
+            f.write(body)
+        os.replace(tmpPath, bodyPath)
+    tmpPath = f"{metaPath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmpPath, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmpPath, metaPath)
+
+def fetch_page(url, headers=None):
+    #returns the raw bytes of url, from disk when the cached copy is still fresh
+    if scrapeFixtures.is_active():
+        return scrapeSession.get(url, headers=headers).content #recording needs every page to hit the network, replay needs none to come from disk
+    body, meta = _read_entry(url)
+    requestHeaders = dict(headers or {})
+    if body is not None:
+        ttl = page_ttl(url, meta['fetchedAt'])
+        if ttl is FOREVER or time.time() - meta['fetchedAt'] < ttl:
+            return body
+        if meta.get('etag'):
+            requestHeaders['If-None-Match'] = meta['etag']
+        if meta.get('lastModified'):
+            requestHeaders['If-Modified-Since'] = meta['lastModified']
+
+    try:
+        response = scrapeSession.get(url, headers=requestHeaders)
+    except scrapeSession.CircuitOpenError:
+        if body is not None:
+            return body #ESPN is throttling us, keep serving what we have until the breaker closes
+        raise
+
+    if response.status_code == 304 and body is not None:
+        meta['fetchedAt'] = time.time()
+        _write_entry(url, None, meta)
+        return body
+    if response.status_code == 200:
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'lastModified': response.headers.get('Last-Modified'),
+            'fetchedAt': time.time()
+        }
+        _write_entry(url, response.content, meta)
+        return response.content
+    if body is not None:
+        return body #ESPN is having issues, a stale page is better than an error page
+    return response.content
+
+def clear_cache():
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for fileName in os.listdir(CACHE_DIR):
+        os.remove(os.path.join(CACHE_DIR, fileName))
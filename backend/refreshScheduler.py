@@ -0,0 +1,212 @@
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from gamesFromMLB import get_team_registry, get_schedule, EST, MAX_IN_FLIGHT
+import databaseCode
+from dbConnection import writing
+
+'''
+Keeps the database fresh in the background instead of rebuilding every table from a cron job. Every team has its own
+schedule/roster/leaders jobs, each job scrapes one team and upserts only that team's rows, and how often a job runs
+depends on whether the team plays today (gameday), soon (offday) or not at all (offseason).
+
+Scraping runs on a thread pool, writes go through dbConnection.writing() behind a lock since DuckDB only has one
+writer, a short transaction per batch, and the scheduler doesn't keep the database open between them. A job is never
+queued again while it's still running, so a slow ESPN page can't pile up copies of the same job.
+
+Two ways to run it next to the API:
+- inside the API process (REFRESH_IN_API=1 python app.py, or RefreshScheduler().start()), its writes are cursors on the
+  API's own connection and reads never wait for them. This is the one to use when both run on the same machine
+- as its own process (python refreshScheduler.py), every batch borrows the file from the API (see dbConnection), API
+  queries wait while a batch is written, well under a second for one team's rows
+'''
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+GAMEDAY = 'gameday'
+OFFDAY = 'offday'
+OFFSEASON = 'offseason'
+
+# seconds between runs of each kind of job, by the team's status
+INTERVALS = {
+    'schedule': {GAMEDAY: 5 * MINUTE, OFFDAY: HOUR, OFFSEASON: DAY},
+    'roster': {GAMEDAY: 3 * HOUR, OFFDAY: 6 * HOUR, OFFSEASON: 2 * DAY},
+    'leaders': {GAMEDAY: 30 * MINUTE, OFFDAY: 3 * HOUR, OFFSEASON: 2 * DAY}, # leaders and standing come from the same page
+}
+TEAMS_INTERVAL = DAY
+
+# a team whose next game is further away than this is treated as offseason
+OFFDAY_WINDOW = 7 * DAY
+# seconds between the first runs of two teams, so startup doesn't hit ESPN with 30 teams x 3 jobs at once
+STAGGER = float(os.getenv('REFRESH_STAGGER', '2'))
+WORKERS = int(os.getenv('REFRESH_WORKERS', str(MAX_IN_FLIGHT)))
+
+JOB_KINDS = {
+    'schedule': (databaseCode.scrape_team_schedule, databaseCode.write_team_schedule),
+    'roster': (databaseCode.scrape_team_roster, databaseCode.write_team_roster),
+    'leaders': (databaseCode.scrape_team_leaders, databaseCode.write_team_leaders),
+}
+
+def team_status(schedule, now=None):
+    #gameday if the team has a game today (EST), offday if the next one is within OFFDAY_WINDOW, offseason otherwise
+    now = now if now is not None else datetime.now(EST).timestamp()
+    today = datetime.fromtimestamp(now, EST)
+    todayDate = f"{today:%a, %b} {today.day}" # same format as the schedule page, e.g. 'Sun, Sep 29'
+    if any(game.date == todayDate for game in schedule.games):
+        return GAMEDAY
+    nextGame = schedule.next_game(now)
+    if nextGame and nextGame.timestamp - now < OFFDAY_WINDOW:
+        return OFFDAY
+    return OFFSEASON
+
+class Job:
+    def __init__(self, kind, team, scrape, write, nextRun):
+        self.kind = kind
+        self.team = team
+        self.scrape = scrape
+        self.write = write
+        self.nextRun = nextRun
+        self.running = False
+        self.lastRun = None
+        self.lastDuration = None
+        self.lastError = None
+
+    @property
+    def name(self):
+        return f"{self.kind}:{self.team}" if self.team else self.kind
+
+class RefreshScheduler:
+    def __init__(self, db_path=None, workers=None, stagger=None):
+        self.db_path = db_path
+        self.workers = workers or WORKERS
+        self.stagger = STAGGER if stagger is None else stagger
+        self.jobs = {}
+        self.statuses = {} # team -> GAMEDAY/OFFDAY/OFFSEASON, everyone starts as OFFDAY until their schedule is read
+        self._queue = [] # heap of (nextRun, job name)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock() # one writer at a time, DuckDB would abort the second of two conflicting writes
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._pool = None
+
+    def _add_job(self, kind, team, scrape, write, nextRun):
+        job = Job(kind, team, scrape, write, nextRun)
+        self.jobs[job.name] = job
+        heapq.heappush(self._queue, (nextRun, job.name))
+
+    def _schedule_jobs(self):
+        now = time.time()
+        self._add_job('teams', None, lambda team: get_team_registry(refresh=True), lambda db, team, scraped: databaseCode._initialize_teams_table(db), now + TEAMS_INTERVAL)
+        for i, team in enumerate(get_team_registry()):
+            self.statuses.setdefault(team, OFFDAY)
+            for kind, (scrape, write) in JOB_KINDS.items():
+                self._add_job(kind, team, scrape, write, now + i * self.stagger)
+
+    def interval(self, job):
+        if job.kind == 'teams':
+            return TEAMS_INTERVAL
+        return INTERVALS[job.kind][self.statuses.get(job.team, OFFDAY)]
+
+    def _update_status(self, team):
+        schedule = get_schedule(get_team_registry()[team]['teamSchedule']) # already cached by the schedule job
+        status = team_status(schedule)
+        if status != self.statuses.get(team):
+            print(f"refresh: {team} is now {status}")
+            self.statuses[team] = status
+            self._reschedule_team(team)
+
+    def _reschedule_team(self, team):
+        #pulls the team's queued jobs in if the new interval says they're due sooner
+        now = time.time()
+        with self._lock:
+            for job in self.jobs.values():
+                if job.team != team or job.running:
+                    continue
+                sooner = (job.lastRun or now) + self.interval(job)
+                if sooner < job.nextRun:
+                    job.nextRun = sooner
+                    heapq.heappush(self._queue, (sooner, job.name))
+        self._wake.set()
+
+    def _run(self, job):
+        start = time.time()
+        try:
+            scraped = job.scrape(job.team)
+            with self._db_lock:
+                job.write(self.db_path, job.team, scraped)
+            if job.kind == 'schedule':
+                self._update_status(job.team)
+            job.lastError = None
+        except Exception as e:
+            job.lastError = repr(e)
+        job.lastRun = start
+        job.lastDuration = time.time() - start
+        print(f"refresh: {job.name} took {job.lastDuration:.2f}s" + (f", failed with {job.lastError}" if job.lastError else ""))
+        with self._lock:
+            job.running = False
+            job.nextRun = job.lastRun + self.interval(job)
+            heapq.heappush(self._queue, (job.nextRun, job.name))
+        self._wake.set()
+
+    def _due_jobs(self):
+        #pops every job that is due, returns them and how long to sleep until the next one
+        now = time.time()
+        due = []
+        with self._lock:
+            while self._queue:
+                nextRun, name = self._queue[0]
+                job = self.jobs[name]
+                if job.running or nextRun != job.nextRun:
+                    heapq.heappop(self._queue) # stale entry, the job was rescheduled or is in flight
+                    continue
+                if nextRun > now:
+                    return due, nextRun - now
+                heapq.heappop(self._queue)
+                job.running = True
+                due.append(job)
+        return due, None
+
+    def run_forever(self):
+        with writing(self.db_path) as con:
+            databaseCode.create_tables(con)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._schedule_jobs()
+        try:
+            while not self._stopped.is_set():
+                due, wait = self._due_jobs()
+                for job in due:
+                    self._pool.submit(self._run, job)
+                self._wake.wait(wait)
+                self._wake.clear()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def start(self):
+        thread = threading.Thread(target=self.run_forever, daemon=True, name='refresh-scheduler')
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def status(self):
+        #one dict per job, for logging or an admin endpoint
+        with self._lock:
+            return [{
+                'job': job.name,
+                'teamStatus': self.statuses.get(job.team),
+                'running': job.running,
+                'nextRun': job.nextRun,
+                'lastRun': job.lastRun,
+                'lastDuration': job.lastDuration,
+                'lastError': job.lastError,
+            } for job in sorted(self.jobs.values(), key=lambda job: job.nextRun)]
+
+if __name__ == "__main__":
+    RefreshScheduler().run_forever()
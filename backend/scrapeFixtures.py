@@ -0,0 +1,105 @@
+import atexit
+import json
+import os
+import threading
+import zipfile
+import requests
+from requests.structures import CaseInsensitiveDict
+
+'''
+Record/replay for everything fetched through scrapeSession, so the ingestion pipeline and the Flask endpoints can run
+without ESPN (offline benchmarks, parse regressions).
+
+SCRAPE_MODE=record archives every response (url, status, headers, body) into a zip bundle when the process exits,
+SCRAPE_MODE=replay serves responses from that bundle and never touches the network. SCRAPE_FIXTURES picks the bundle.
+'''
+
+MODE = os.getenv('SCRAPE_MODE', 'live')
+FIXTURES_PATH = os.getenv('SCRAPE_FIXTURES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'espn.zip'))
+
+_lock = threading.Lock()
+_recorded = {} # url -> (status, headers, body)
+_replay = {}
+
+def is_active():
+    return MODE in ('record', 'replay')
+
+def load_bundle(path):
+    entries = {}
+    with zipfile.ZipFile(path) as bundle:
+        index = json.loads(bundle.read('index.json'))
+        for url, entry in index.items():
+            entries[url] = (entry['status'], entry['headers'], bundle.read(entry['body']))
+    return entries
+
+def write_bundle(path, entries):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    index = {}
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for i, (url, (status, headers, body)) in enumerate(entries.items()):
+            bodyName = f"bodies/{i}"
+            bundle.writestr(bodyName, body)
+            index[url] = {'status': status, 'headers': headers, 'body': bodyName}
+        bundle.writestr('index.json', json.dumps(index, indent=1))
+
+def start_recording(path=None):
+    global MODE, FIXTURES_PATH
+    MODE = 'record'
+    FIXTURES_PATH = path or FIXTURES_PATH
+    with _lock:
+        _recorded.clear()
+
+def save_recording(path=None):
+    #merges what was recorded into the bundle on disk, returns the number of responses written
+    path = path or FIXTURES_PATH
+    with _lock:
+        if not _recorded:
+            return 0
+        entries = load_bundle(path) if os.path.exists(path) else {}
+        entries.update(_recorded)
+    write_bundle(path, entries)
+    return len(entries)
+
+def start_replay(path=None):
+    global MODE, FIXTURES_PATH
+    MODE = 'replay'
+    FIXTURES_PATH = path or FIXTURES_PATH
+    entries = load_bundle(FIXTURES_PATH)
+    with _lock:
+        _replay.clear()
+        _replay.update(entries)
+
+def stop():
+    global MODE
+    if MODE == 'record':
+        save_recording()
+    MODE = 'live'
+
+def record_response(url, response):
+    if MODE != 'record':
+        return
+    with _lock:
+        _recorded[url] = (response.status_code, dict(response.headers), response.content)
+
+def replay_response(url):
+    #returns a requests.Response built from the bundle, None when we're not replaying
+    if MODE != 'replay':
+        return None
+    with _lock:
+        entry = _replay.get(url)
+    if entry is None:
+        raise requests.ConnectionError(f"No recorded response for {url} in {FIXTURES_PATH}")
+    status, headers, body = entry
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.url = url
+    response.encoding = 'utf-8'
+    return response
+
+if MODE == 'replay':
+    start_replay()
+elif MODE == 'record':
+    start_recording()
+atexit.register(lambda: save_recording() if MODE == 'record' else None)
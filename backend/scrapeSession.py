@@ -0,0 +1,230 @@
+import requests
+from requests.adapters import HTTPAdapter
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import scrapeFixtures
+
+'''
+One pooled requests session shared by every scraper. Connections are kept alive between pages so we only pay for
+the TCP+TLS handshake once per host, every request has a timeout, and 429/5xx/connection errors are retried with
+jittered exponential backoff.
+
+Every host also gets a token bucket (RATE_PER_HOST requests a second, up to BURST_PER_HOST back to back) so adding
+threads can't push us past what ESPN tolerates, and a circuit breaker that stops sending requests for a while after
+BREAKER_THRESHOLD get() calls in a row failed with 429/5xx/connection errors (each one counts once, after its retries,
+so one broken url can't take the whole host down). While it's open get() raises CircuitOpenError right away and
+pageCache serves its cached copy instead.
+'''
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+CONNECT_TIMEOUT = float(os.getenv('SCRAPE_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('SCRAPE_READ_TIMEOUT', '20'))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('SCRAPE_MAX_CONNECTIONS_PER_HOST', '10'))
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5 # seconds, doubled on every retry
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# the host's fault, retried and counted against its breaker. Anything else (bad url, too many redirects) is ours
+HOST_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+RATE_PER_HOST = float(os.getenv('SCRAPE_RATE_PER_HOST', '5')) # tokens added per second
+BURST_PER_HOST = int(os.getenv('SCRAPE_BURST_PER_HOST', '10')) # bucket size
+BREAKER_THRESHOLD = int(os.getenv('SCRAPE_BREAKER_THRESHOLD', '5')) # failed requests in a row before the breaker opens
+BREAKER_COOLDOWN = float(os.getenv('SCRAPE_BREAKER_COOLDOWN', '60')) # seconds before a trial request is let through
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update({'User-Agent': USER_AGENT})
+                # pool_block makes extra threads wait for a free connection instead of opening more than the limit
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONNECTIONS_PER_HOST, pool_block=True)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+class CircuitOpenError(requests.ConnectionError):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        #blocks until a token is free, returns how long we waited
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class CircuitBreaker:
+    #closed -> open after threshold failures in a row -> half open (one trial request) after cooldown
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.openedAt = None
+        self.trialInFlight = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        #False when the request must not be sent, 'trial' for the one request let through while half open
+        with self.lock:
+            if self.openedAt is None:
+                return True
+            if time.monotonic() - self.openedAt < self.cooldown or self.trialInFlight:
+                return False
+            self.trialInFlight = True
+            return 'trial'
+
+    def end_trial(self):
+        #the trial ended without record() (it raised something that isn't the host's fault), the next request is the trial
+        with self.lock:
+            self.trialInFlight = False
+
+    def record(self, ok):
+        #returns True when this call opened the breaker
+        with self.lock:
+            self.trialInFlight = False
+            if ok:
+                self.failures = 0
+                self.openedAt = None
+                return False
+            self.failures += 1
+            if self.failures >= self.threshold:
+                opened = self.openedAt is None
+                self.openedAt = time.monotonic()
+                return opened
+            return False
+
+    @property
+    def state(self):
+        if self.openedAt is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.openedAt >= self.cooldown else 'open'
+
+class HostLimiter:
+    def __init__(self):
+        self.bucket = TokenBucket(RATE_PER_HOST, BURST_PER_HOST)
+        self.breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+        self.statsLock = threading.Lock()
+        self.stats = {'requests': 0, 'waited': 0.0, 'maxWait': 0.0, 'throttled': 0, 'failures': 0, 'rejected': 0, 'breakerOpened': 0}
+
+    def count(self, stat):
+        with self.statsLock:
+            self.stats[stat] += 1
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(url):
+    host = urlsplit(url).netloc
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter()
+        return _limiters[host]
+
+def metrics():
+    #per host counters, waited/maxWait are seconds spent waiting for a token. Compare with requests to tune MAX_IN_FLIGHT
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    result = {}
+    for host, limiter in limiters.items():
+        with limiter.statsLock:
+            stats = dict(limiter.stats)
+        stats['avgWait'] = stats['waited'] / stats['requests'] if stats['requests'] else 0.0
+        stats['breaker'] = limiter.breaker.state
+        result[host] = stats
+    return result
+
+def reset_limiters():
+    with _limiters_lock:
+        _limiters.clear()
+
+def _admit(limiter, url):
+    #once per get(), returns what the breaker said
+    admitted = limiter.breaker.allow()
+    if not admitted:
+        limiter.count('rejected')
+        raise CircuitOpenError(f"Too many failures from {urlsplit(url).netloc}, not sending {url}")
+    return admitted
+
+def _acquire(limiter):
+    #once per attempt
+    waited = limiter.bucket.acquire()
+    with limiter.statsLock:
+        stats = limiter.stats
+        stats['requests'] += 1
+        stats['waited'] += waited
+        stats['maxWait'] = max(stats['maxWait'], waited)
+
+def _record_failure(limiter):
+    #the request gave up, retries included
+    if limiter.breaker.record(False):
+        limiter.count('breakerOpened')
+
+def backoff_delay(attempt, retryAfter=None):
+    #full jitter: sleep anywhere between 0 and the exponential cap, so retrying threads don't all hit ESPN at once
+    if retryAfter is not None and retryAfter.isdigit():
+        return min(int(retryAfter), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+def get(url, headers=None, timeout=None, **kwargs):
+    #drop in replacement for requests.get that goes through the shared session
+    replayed = scrapeFixtures.replay_response(url)
+    if replayed is not None:
+        return replayed
+    session = get_session()
+    limiter = get_limiter(url)
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    admitted = _admit(limiter, url)
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            _acquire(limiter)
+            try:
+                response = session.get(url, headers=headers, timeout=timeout, **kwargs)
+            except HOST_ERRORS:
+                limiter.count('failures')
+                if attempt == MAX_RETRIES:
+                    _record_failure(limiter)
+                    raise
+                time.sleep(backoff_delay(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES:
+                if response.status_code == 429:
+                    limiter.count('throttled')
+                limiter.count('failures')
+                if attempt < MAX_RETRIES:
+                    time.sleep(backoff_delay(attempt, response.headers.get('Retry-After')))
+                    continue
+                _record_failure(limiter)
+            else:
+                limiter.breaker.record(True)
+            scrapeFixtures.record_response(url, response)
+            return response
+    finally:
+        if admitted == 'trial':
+            limiter.breaker.end_trial() # no-op when the trial was recorded above
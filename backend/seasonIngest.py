@@ -0,0 +1,97 @@
+import os
+import sys
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+from gamesFromMLB import get_team_registry, prefetch_schedules, season_schedule_urls
+from dbConnection import writing
+from databaseCode import TABLE_SCHEMAS, bump_generation, game_key, parse_result, team_key
+
+'''
+Loads every regular season and postseason game of every team for a whole season into the SeasonGames table, so
+date range and head to head questions are answered from the database instead of scraping a schedule per request.
+
+Each season is written to its own parquet file (seasons/season=YYYY/games.parquet) from an Arrow table and swapped
+into SeasonGames in one statement, re-running a season replaces just that season.
+'''
+
+SEASONS_DIR = os.getenv('SEASONS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'seasons'))
+
+SEASON_SCHEMA = pa.schema([
+    ('season', pa.int32()),
+    ('seasonType', pa.string()),
+    ('gameKey', pa.string()),
+    ('homeTeam', pa.string()),
+    ('awayTeam', pa.string()),
+    ('date', pa.date32()),
+    ('doubleheader', pa.int32()),
+    ('homeScore', pa.int32()),
+    ('awayScore', pa.int32()),
+    ('startTime', pa.string()),
+])
+
+def scrape_season(season):
+    #returns one dict per game (SEASON_SCHEMA columns) for every team's schedule pages of season
+    registry = get_team_registry()
+    displayNames = {team_key(team): team for team in registry}
+    pages = [(team, seasonType, url) for team, info in registry.items()
+             for seasonType, url in season_schedule_urls(info['teamAbbreviation'], season)]
+    schedules = prefetch_schedules(url for _, _, url in pages)
+
+    games = {}
+    for team, seasonType, url in pages:
+        schedule = schedules[url]
+        year = schedule.year or season
+        for game in schedule.games:
+            opponent = displayNames.get(team_key(game.opponent), game.opponent)
+            date = datetime.strptime(f"{game.date} {year}", '%a, %b %d %Y').date()
+            key = game_key(team, opponent, date.isoformat(), game.game_number)
+            if key in games and (games[key]['homeScore'] is not None or not game.result):
+                continue # already have it from the opponent's schedule
+            teamScore = opponentScore = None
+            if game.result:
+                _, teamScore, opponentScore = parse_result(game.result)
+            home, away = (team, opponent) if game.home else (opponent, team)
+            homeScore, awayScore = (teamScore, opponentScore) if game.home else (opponentScore, teamScore)
+            games[key] = {'season': season, 'seasonType': seasonType, 'gameKey': key, 'homeTeam': home,
+                          'awayTeam': away, 'date': date, 'doubleheader': game.game_number,
+                          'homeScore': homeScore, 'awayScore': awayScore, 'startTime': game.time}
+    return list(games.values())
+
+def write_season_partition(season, rows):
+    #columnar dump of one season, returns the parquet path
+    path = os.path.join(SEASONS_DIR, f"season={season}", 'games.parquet')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(pa.Table.from_pylist(rows, schema=SEASON_SCHEMA), path)
+    return path
+
+def load_season_partition(con, season, path):
+    #replaces season in SeasonGames with the contents of the parquet file, in one transaction
+    con.sql(TABLE_SCHEMAS['SeasonGames'])
+    con.begin()
+    try:
+        con.execute("DELETE FROM SeasonGames WHERE season = ?", [season])
+        con.execute(f"INSERT INTO SeasonGames SELECT * FROM read_parquet('{path}')")
+        loaded = con.execute("SELECT COUNT(*) FROM SeasonGames WHERE season = ?", [season]).fetchone()[0]
+        bump_generation(con, 'SeasonGames')
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    return loaded
+
+def ingest_season(db, season):
+    rows = scrape_season(season)
+    path = write_season_partition(season, rows)
+    # the database is only held while the partition is swapped in, not while the season is scraped
+    with writing(db) as con:
+        loaded = load_season_partition(con, season, path)
+    print(f"SeasonGames: loaded {loaded} games for {season}")
+    return loaded
+
+def ingest_seasons(seasons, db_path=None):
+    return {season: ingest_season(db_path, season) for season in seasons}
+
+if __name__ == "__main__":
+    # python seasonIngest.py 2023 2024 (defaults to last season)
+    ingest_seasons([int(season) for season in sys.argv[1:]] or [datetime.now().year - 1])
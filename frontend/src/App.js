@@ -230,13 +230,19 @@ function App() {
         try {
           let curTeamData = {}
 
-          const recordsFetch = await axios.get("http://127.0.0.1:5000/api/fetch_data_from_database", {
-            params: {
+          // Everything that comes from the database in one request
+          const tables = ["Records", "Players Many", "Games", "UpcomingGames"];
+          const batchFetch = await axios.post("http://127.0.0.1:5000/api/fetch_data_from_database/batch",
+            tables.map((tableName) => ({
               parameter: specificTeamData.displayName,
-              tableName: "Records"
-            }
-          });
-          curTeamData.record = recordsFetch.data[0];
+              tableName: tableName
+            }))
+          );
+          const [records, players, games, upcomingGames] = batchFetch.data;
+          curTeamData.record = records[0];
+          curTeamData.playerData = players;
+          curTeamData.games = games;
+          curTeamData.upcomingGames = upcomingGames;
 
           const teamLeadersFetch = await axios.get("http://127.0.0.1:5000/api/get_team_leaders", {
             params: {
@@ -245,30 +251,6 @@ function App() {
           });
           curTeamData.standing = teamLeadersFetch.data.standing;
           curTeamData.bestPlayers = teamLeadersFetch.data.leaders;
-
-          const playersFetch = await axios.get("http://127.0.0.1:5000/api/fetch_data_from_database", {
-            params: {
-              parameter: specificTeamData.displayName,
-              tableName: "Players Many"
-            }
-          });
-          curTeamData.playerData = playersFetch.data;
-
-          const gamesFetch = await axios.get("http://127.0.0.1:5000/api/fetch_data_from_database", {
-            params: {
-              parameter: specificTeamData.displayName,
-              tableName: "Games"
-            }
-          });
-          curTeamData.games = gamesFetch.data;
-
-          const upcomingGamesFetch = await axios.get("http://127.0.0.1:5000/api/fetch_data_from_database", {
-            params: {
-              parameter: specificTeamData.displayName,
-              tableName: "UpcomingGames"
-            }
-          });
-          curTeamData.upcomingGames = upcomingGamesFetch.data;
           
           curTeamData.teamDict = specificTeamData;
 
@@ -1,28 +1,20 @@
 import os
+import sys
 from dotenv import load_dotenv
 import psycopg2
-from bs4 import BeautifulSoup
-import requests
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from gamesFromMLB import scrape_concurrently
+import scrapeSession
+from leadersExtractor import extract_standing
 
 load_dotenv()
 
 db_url = os.getenv('DIRECT_URL')
 
 def get_team_standing(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.content, 'html.parser')
-    
-    standing_tags = soup.find_all('li')
-    for tag in standing_tags:
-        for string in tag.stripped_strings:
-            text = repr(string)
-            if 'NL ' in text or 'AL ' in text:
-                # Remove quotes and escape characters from the string
-                return text.strip("'")
-    return None
+    response = scrapeSession.get(url)
+    return extract_standing(response.content, first=True) # the first <li> that mentions the league, like before
 
 def add_standings_column():
     conn = psycopg2.connect(db_url)
@@ -55,10 +47,10 @@ def update_team_standings():
         cur.execute('SELECT "teamId", "teamAbbreviation" FROM "Teams"')
         teams = cur.fetchall()
         
-        for team_id, abbr in teams:
-            team_url = f"https://www.espn.com/mlb/team/stats/_/name/{abbr}"
-            standing = get_team_standing(team_url)
-            
+        team_urls = [f"https://www.espn.com/mlb/team/stats/_/name/{abbr}" for _, abbr in teams]
+        standings = scrape_concurrently(get_team_standing, team_urls)
+        
+        for (team_id, abbr), standing in zip(teams, standings):
             if standing:
                 cur.execute("""
                     UPDATE "Teams"
@@ -1,185 +1,507 @@
 import duckdb
-import pandas as pd
-from sqlalchemy import create_engine, text
+import io
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import psycopg2
 from dotenv import load_dotenv
 
+'''
+Streams every DuckDB table into Postgres without going through files or pandas. Each table is read as Arrow record
+batches, every batch is encoded to CSV in memory and handed to COPY ... FROM STDIN as Postgres asks for more, so at
+most one batch per table is held in memory. Tables are copied side by side, each on its own DuckDB cursor and Postgres
+connection, and each one in a single transaction, so a re-run replaces the data instead of appending it again. Tables
+are never truncated (Postgres refuses that for a table other tables have foreign keys to, like "Players" and "Teams"):
+a table with a key (its primary key, or else a unique index like Players' playerId) is staged in a temp table, upserted
+on the key and the rows whose key is gone are deleted, a table without one is emptied with DELETE. TableGenerations,
+the backend's query cache bookkeeping, is never sent.
+
+With --sync only what changed since the last sync is sent. Every row is hashed in DuckDB and the hash of all of a
+table's row hashes is its watermark, kept in Postgres next to the data (duckdb_sync_watermarks), so a table that didn't
+change costs one local scan and nothing on the network. For a table that did, the hash of every row shipped so far is
+read back (duckdb_sync_state), DuckDB works out which rows are new, changed or gone, and only those are sent: upserted
+with INSERT ... ON CONFLICT DO UPDATE on the key and deleted by key, all in one transaction. Tables without a key have
+nothing to upsert on and are replaced whole when their watermark moves.
+
+python duckdb_to_psql.py [--sync] [table ...]
+'''
+
+# rows per Arrow record batch, one batch is encoded and sent at a time
+BATCH_ROWS = int(os.getenv('MIGRATE_BATCH_ROWS', '100000'))
+# tables copied at once
+WORKERS = int(os.getenv('MIGRATE_WORKERS', '4'))
+
+TYPE_MAPPING = {
+    'BOOLEAN': 'BOOLEAN',
+    'TINYINT': 'SMALLINT',
+    'SMALLINT': 'SMALLINT',
+    'INTEGER': 'INTEGER',
+    'BIGINT': 'BIGINT',
+    'DECIMAL': 'DECIMAL',
+    'REAL': 'REAL',
+    'FLOAT': 'REAL',
+    'DOUBLE': 'DOUBLE PRECISION',
+    'VARCHAR': 'VARCHAR',
+    'TEXT': 'TEXT',
+    'DATE': 'DATE',
+    'TIME': 'TIME',
+    'TIMESTAMP': 'TIMESTAMP',
+    'TIMESTAMP WITH TIME ZONE': 'TIMESTAMPTZ',
+    'BLOB': 'BYTEA'
+}
+
+CSV_OPTIONS = pacsv.WriteOptions(include_header=False)
+
+# DuckDB tables that only mean something to the backend, bumped on every write
+SKIP_TABLES = {'TableGenerations'}
+
 def get_table_constraints(conn, table_name):
     """
     Extract constraints from DuckDB table using DuckDB's specific schema queries
     """
     # Get primary key and unique constraints from table info
-    constraint_query = f"""
-    SELECT 
+    constraint_query = """
+    SELECT
         column_name,
         CASE WHEN is_nullable = 'NO' THEN true ELSE false END as not_null,
         CASE WHEN is_generated = 'ALWAYS' THEN true ELSE false END as is_generated
-    FROM information_schema.columns 
-    WHERE table_name = '{table_name}'
+    FROM information_schema.columns
+    WHERE table_name = ?
     """
-    
+
     constraints = {
-        'columns': conn.execute(constraint_query).fetchall()
+        'columns': conn.execute(constraint_query, [table_name]).fetchall()
     }
-    
+
     # Get index information
     try:
         index_query = f"PRAGMA table_info('{table_name}')"
         index_info = conn.execute(index_query).fetchall()
-        
+
         # Extract primary key columns from pragma info
-        pk_columns = [col[1] for col in index_info if col[5] > 0]  # col[5] is pk flag
+        pk_columns = [col[1] for col in index_info if col[5]]  # col[5] is pk flag
         constraints['primary_keys'] = pk_columns
-        
+
     except Exception as e:
         print(f"Warning: Could not get index information for {table_name}: {e}")
         constraints['primary_keys'] = []
-    
+
+    # Unique indexes on plain columns (expressions look like [playerId] or ['"name"'])
+    constraints['unique_keys'] = []
+    columns = {row[0] for row in constraints['columns']}
+    for (expressions,) in conn.execute("SELECT expressions FROM duckdb_indexes() WHERE table_name = ? AND is_unique \
+                                       AND NOT is_primary ORDER BY index_name", [table_name]).fetchall():
+        key = [part.strip().strip("'").strip('"') for part in expressions.strip('[]').split(',')]
+        if all(col in columns for col in key):
+            constraints['unique_keys'].append(key)
+
     return constraints
 
-def extract_tables_from_duckdb(db_path):
+def row_key(metadata):
+    """
+    Columns rows are matched on between DuckDB and Postgres: the primary key, else the first unique index, else []
+    """
+    constraints = metadata['constraints']
+    if constraints['primary_keys']:
+        return constraints['primary_keys']
+    return constraints['unique_keys'][0] if constraints['unique_keys'] else []
+
+def get_table_metadata(conn, tables=None):
     """
-    Extract all tables and their constraints from DuckDB database and save as CSV files
+    Column types and constraints of every table in the DuckDB database (views are skipped), or of just the given tables
     """
-    conn = duckdb.connect(db_path)
-    
-    # Get list of all tables
-    tables = conn.execute("SELECT table_name FROM information_schema.tables WHERE table_schema='main'").fetchall()
-    
-    if not os.path.exists('exports'):
-        os.makedirs('exports')
-    
-    exported_files = []
+    names = [row[0] for row in conn.execute(
+        "SELECT table_name FROM information_schema.tables WHERE table_schema='main' AND table_type='BASE TABLE'").fetchall()
+        if row[0] not in SKIP_TABLES]
+    if tables:
+        missing = set(tables) - set(names)
+        if missing:
+            raise ValueError(f"Tables not found in DuckDB: {', '.join(sorted(missing))}")
+        names = [name for name in names if name in tables]
+
     table_metadata = {}
-    
-    for table in tables:
-        table_name = table[0]
-        print(f"Exporting table: {table_name}")
-        
-        # Get table schema including column types
-        schema_query = f"""
-        SELECT 
+    for table_name in names:
+        schema = conn.execute("""
+        SELECT
             column_name,
             data_type,
             CASE WHEN is_nullable = 'NO' THEN false ELSE true END as is_nullable
-        FROM information_schema.columns 
-        WHERE table_name = '{table_name}'
+        FROM information_schema.columns
+        WHERE table_name = ?
         ORDER BY ordinal_position
-        """
-        schema = conn.execute(schema_query).fetchall()
-        
-        # Get constraints
-        constraints = get_table_constraints(conn, table_name)
-        
-        # Store metadata
+        """, [table_name]).fetchall()
         table_metadata[table_name] = {
             'schema': schema,
-            'constraints': constraints
+            'constraints': get_table_constraints(conn, table_name)
         }
-        
-        # Export data to CSV
-        df = conn.execute(f"SELECT * FROM {table_name}").df()
-        csv_path = f"exports/{table_name}.csv"
-        df.to_csv(csv_path, index=False)
-        exported_files.append((table_name, csv_path))
-        
-        print(f"Exported {len(df)} rows to {csv_path}")
-    
-    conn.close()
-    return exported_files, table_metadata
-
-def create_postgres_tables(connection_string, table_metadata):
+    return table_metadata
+
+def quote_identifier(name):
+    """
+    name as a quoted Postgres identifier, so "playerId" stays playerId instead of being folded to playerid
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+def postgres_type(duck_type):
+    """
+    Postgres type for a DuckDB type, lists (VARCHAR[]) become Postgres arrays, anything unknown is stored as TEXT
+    """
+    duck_type = duck_type.upper()
+    if duck_type.endswith('[]'):
+        return postgres_type(duck_type[:-2]) + '[]'
+    return TYPE_MAPPING.get(duck_type.split('(')[0], 'TEXT')
+
+def select_column(col_name, duck_type):
+    """
+    Expression reading a column in a form COPY's csv format understands as the type postgres_type picked
+    """
+    duck_type = duck_type.upper()
+    col = f'"{col_name}"'
+    if duck_type.endswith('[]'):
+        # Postgres array literal, {"a","b"} with every element quoted and \ and " escaped
+        element = rf"""CASE WHEN x IS NULL THEN 'NULL' ELSE '"' || replace(replace(CAST(x AS VARCHAR), '\', '\\'), '"', '\"') || '"' END"""
+        return f"CASE WHEN {col} IS NULL THEN NULL ELSE '{{' || array_to_string(list_transform({col}, x -> {element}), ',') || '}}' END"
+    if duck_type == 'BLOB':
+        return rf"'\x' || hex({col})"
+    if duck_type.startswith(('TIME', 'INTERVAL', 'UUID')) or duck_type not in TYPE_MAPPING and '(' not in duck_type:
+        # Arrow writes these in formats Postgres doesn't always read (nanoseconds, structs), DuckDB's text form it does
+        return f"CAST({col} AS VARCHAR)"
+    return col
+
+def create_postgres_tables(pg_conn, table_metadata):
     """
     Create tables in PostgreSQL with constraints
     """
-    engine = create_engine(connection_string)
-    
-    type_mapping = {
-        'BOOLEAN': 'BOOLEAN',
-        'TINYINT': 'SMALLINT',
-        'SMALLINT': 'SMALLINT',
-        'INTEGER': 'INTEGER',
-        'BIGINT': 'BIGINT',
-        'DECIMAL': 'DECIMAL',
-        'REAL': 'REAL',
-        'DOUBLE': 'DOUBLE PRECISION',
-        'VARCHAR': 'VARCHAR',
-        'TEXT': 'TEXT',
-        'DATE': 'DATE',
-        'TIME': 'TIME',
-        'TIMESTAMP': 'TIMESTAMP',
-        'BLOB': 'BYTEA'
-    }
-    
-    with engine.connect() as conn:
+    with pg_conn.cursor() as cur:
         for table_name, metadata in table_metadata.items():
             columns = []
-            
+
             # Add column definitions with constraints
-            for col in metadata['schema']:
-                col_name = col[0]
-                col_type = col[1].upper()
-                is_nullable = col[2]
-                
-                pg_type = type_mapping.get(col_type, 'TEXT')
+            for col_name, col_type, is_nullable in metadata['schema']:
                 null_constraint = '' if is_nullable else 'NOT NULL'
-                
-                columns.append(f"{col_name} {pg_type} {null_constraint}".strip())
-            
+                columns.append(f"{quote_identifier(col_name)} {postgres_type(col_type)} {null_constraint}".strip())
+
             # Add primary key constraint if exists
             if metadata['constraints']['primary_keys']:
-                pk_columns = ', '.join(metadata['constraints']['primary_keys'])
+                pk_columns = ', '.join(quote_identifier(key) for key in metadata['constraints']['primary_keys'])
                 columns.append(f"PRIMARY KEY ({pk_columns})")
-            
-            create_table_sql = f"""
-            CREATE TABLE IF NOT EXISTS {table_name} (
-                {', '.join(columns)}
-            );
-            """
-            conn.execute(text(create_table_sql))
+
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table_name)} ({', '.join(columns)})")
+
+            # ON CONFLICT needs the key to be unique in Postgres too, also for tables created before it was used
+            key = row_key(metadata)
+            if key and not metadata['constraints']['primary_keys']:
+                index_name = quote_identifier(f"{table_name}_{'_'.join(key)}_key")
+                cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {quote_identifier(table_name)} \
+                            ({', '.join(quote_identifier(col) for col in key)})")
             print(f"Created table: {table_name}")
+    pg_conn.commit()
+
+class Progress:
+    """
+    Rows sent per table and overall, printed as every batch goes out
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.tables = {}
+
+    def begin(self, table_name):
+        with self.lock:
+            self.tables[table_name] = [0, time.perf_counter(), None]
+
+    def add(self, table_name, rows):
+        with self.lock:
+            table = self.tables[table_name]
+            table[0] += rows
+            elapsed = time.perf_counter() - table[1]
+            print(f"{table_name}: {table[0]:,} rows ({table[0] / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    def finish(self, table_name):
+        with self.lock:
+            table = self.tables[table_name]
+            table[2] = time.perf_counter() - table[1]
+            print(f"Copied {table_name}: {table[0]:,} rows in {table[2]:.2f}s ({table[0] / max(table[2], 1e-9):,.0f} rows/s)")
+
+    def total(self):
+        with self.lock:
+            return sum(table[0] for table in self.tables.values()), time.perf_counter() - self.start
+
+class CsvStream:
+    """
+    File like object for copy_expert, reads the next Arrow batch only once Postgres has taken the previous one
+    """
+    def __init__(self, reader, on_batch=None):
+        self.reader = reader
+        self.on_batch = on_batch
+        self.data = b''
+        self.pos = 0
+        self.rows = 0
+
+    def read(self, size=-1):
+        while self.pos >= len(self.data):
+            try:
+                batch = self.reader.read_next_batch()
+            except StopIteration:
+                return b''
+            sink = pa.BufferOutputStream()
+            pacsv.write_csv(batch, sink, CSV_OPTIONS)
+            self.data = sink.getvalue().to_pybytes()
+            self.pos = 0
+            self.rows += batch.num_rows
+            if self.on_batch:
+                self.on_batch(batch.num_rows)
+        end = len(self.data) if size is None or size < 0 else self.pos + size
+        chunk = self.data[self.pos:end]
+        self.pos += len(chunk)
+        return chunk
+
+def read_batches(duck_conn, table_name, metadata, source=None, extra=()):
+    """
+    The whole table (or the rows of source, a query with the table's columns) as an Arrow RecordBatchReader of
+    BATCH_ROWS rows at a time, extra columns of source are read after the table's
+    """
+    select = ', '.join([select_column(col_name, col_type) for col_name, col_type, _ in metadata['schema']] + list(extra))
+    source = source or f'"{table_name}"'
+    return duck_conn.execute(f"SELECT {select} FROM {source}").fetch_record_batch(BATCH_ROWS)
 
-def import_csv_to_postgres(connection_string, exported_files):
+def copy_batches(cur, table_name, columns, reader, on_batch=None):
     """
-    Import CSV files into PostgreSQL
+    COPY the batches of reader into table_name (columns in reader order), returns the number of rows sent
     """
-    engine = create_engine(connection_string)
-    
-    for table_name, csv_path in exported_files:
-        print(f"Importing {csv_path} into {table_name}")
-        
-        # Read CSV in chunks to handle large files
-        for chunk in pd.read_csv(csv_path, chunksize=10000):
-            chunk.to_sql(table_name, engine, if_exists='append', index=False)
-        
-        print(f"Imported {csv_path}")
+    stream = CsvStream(reader, on_batch)
+    column_list = ', '.join(quote_identifier(col) for col in columns)
+    cur.copy_expert(f"COPY {quote_identifier(table_name)} ({column_list}) FROM STDIN WITH (FORMAT csv)", stream)
+    return stream.rows
+
+def upsert_rows(cur, table_name, source, columns, keys):
+    """
+    INSERT the rows of source (a table with the same columns) into table_name, updating the rows whose keys exist already
+    """
+    updates = [quote_identifier(col) for col in columns if col not in keys]
+    conflict = f"DO UPDATE SET {', '.join(f'{col} = EXCLUDED.{col}' for col in updates)}" if updates else "DO NOTHING"
+    column_list = ', '.join(quote_identifier(col) for col in columns)
+    cur.execute(f"INSERT INTO {quote_identifier(table_name)} ({column_list}) SELECT {column_list} FROM {source} \
+                ON CONFLICT ({', '.join(quote_identifier(key) for key in keys)}) {conflict}")
+
+def copy_table(duck_conn, connection_string, table_name, metadata, progress):
+    """
+    Replace the Postgres table's rows with the DuckDB table's in one transaction, returns the number of rows copied
+    """
+    columns = [col[0] for col in metadata['schema']]
+    keys = row_key(metadata)
+    target = quote_identifier(table_name)
+    progress.begin(table_name)
+    on_batch = lambda batch_rows: progress.add(table_name, batch_rows)
+    pg_conn = psycopg2.connect(connection_string)
+    try:
+        with pg_conn, pg_conn.cursor() as cur:
+            reader = read_batches(duck_conn.cursor(), table_name, metadata)
+            if not keys:
+                cur.execute(f"DELETE FROM {target}")
+                rows = copy_batches(cur, table_name, columns, reader, on_batch)
+            else:
+                cur.execute(f"CREATE TEMP TABLE _copy_rows (LIKE {target}) ON COMMIT DROP")
+                rows = copy_batches(cur, '_copy_rows', columns, reader, on_batch)
+                match = ' AND '.join(f"c.{quote_identifier(key)} = t.{quote_identifier(key)}" for key in keys)
+                cur.execute(f"DELETE FROM {target} t WHERE NOT EXISTS (SELECT 1 FROM _copy_rows c WHERE {match})")
+                upsert_rows(cur, table_name, '_copy_rows', columns, keys)
+    finally:
+        pg_conn.close()
+    progress.finish(table_name)
+    return rows
+
+def migrate(duckdb_path, connection_string, tables=None, workers=None):
+    """
+    Copy every table (or just tables) from the DuckDB file into Postgres, returns {table: rows copied}
+    """
+    duck_conn = duckdb.connect(duckdb_path, read_only=True)
+    try:
+        table_metadata = get_table_metadata(duck_conn, tables)
+
+        pg_conn = psycopg2.connect(connection_string)
+        try:
+            create_postgres_tables(pg_conn, table_metadata)
+        finally:
+            pg_conn.close()
+
+        progress = Progress()
+        with ThreadPoolExecutor(max_workers=workers or WORKERS) as pool:
+            futures = {table_name: pool.submit(copy_table, duck_conn, connection_string, table_name, metadata, progress)
+                       for table_name, metadata in table_metadata.items()}
+            copied = {table_name: future.result() for table_name, future in futures.items()}
+    finally:
+        duck_conn.close()
+
+    rows, elapsed = progress.total()
+    print(f"Copied {rows:,} rows from {len(copied)} tables in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return copied
+
+SYNC_WATERMARKS = 'duckdb_sync_watermarks'
+SYNC_STATE = 'duckdb_sync_state'
+
+def create_sync_tables(pg_conn):
+    """
+    Tables holding what --sync has shipped so far, one watermark per table and one hash per row
+    """
+    with pg_conn.cursor() as cur:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {SYNC_WATERMARKS} (table_name TEXT PRIMARY KEY, watermark BIGINT, \
+                    rows BIGINT, synced_at TIMESTAMPTZ)")
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {SYNC_STATE} (table_name TEXT, key TEXT, row_hash BIGINT, \
+                    PRIMARY KEY (table_name, key))")
+    pg_conn.commit()
+
+def hashed_rows(table_name, metadata):
+    """
+    Query over the table's rows plus _sync_hash, a hash of every column, and _sync_key, the row_key as json
+    (NULL for tables without one). DuckDB's hash can change between DuckDB versions, which only means one full resend
+    """
+    columns = [f'"{col[0]}"' for col in metadata['schema']]
+    keys = [f'"{key}" := "{key}"' for key in row_key(metadata)]
+    key = f"to_json(struct_pack({', '.join(keys)}))" if keys else 'NULL'
+    return f'SELECT *, {key} AS _sync_key, (hash({", ".join(columns)}) >> 1)::BIGINT AS _sync_hash FROM "{table_name}"'
+
+def table_watermarks(duck_conn, table_metadata):
+    """
+    {table: (rows, watermark)}, the watermark changes whenever any row is added, changed or removed
+    """
+    return {table_name: duck_conn.execute(f"SELECT count(*), (hash(count(*), sum(_sync_hash)) >> 1)::BIGINT \
+                                          FROM ({hashed_rows(table_name, metadata)})").fetchone()
+            for table_name, metadata in table_metadata.items()}
+
+def read_sync_state(cur, table_name):
+    """
+    (key, row_hash) of every row of the table shipped by earlier syncs, as an Arrow table
+    """
+    buffer = io.BytesIO()
+    cur.copy_expert(cur.mogrify(f"COPY (SELECT key, row_hash FROM {SYNC_STATE} WHERE table_name = %s) TO STDOUT \
+                                WITH (FORMAT csv)", [table_name]).decode(), buffer)
+    if not buffer.tell():
+        return pa.table({'key': pa.array([], pa.string()), 'row_hash': pa.array([], pa.int64())})
+    buffer.seek(0)
+    return pacsv.read_csv(buffer, read_options=pacsv.ReadOptions(column_names=['key', 'row_hash']),
+                          convert_options=pacsv.ConvertOptions(column_types={'key': pa.string(), 'row_hash': pa.int64()}))
+
+def sync_table(duck_conn, connection_string, table_name, metadata, watermark, progress):
+    """
+    Send the table's new, changed and removed rows in one transaction and move its watermark, returns
+    (rows upserted, rows deleted), a table without a key is replaced and reports None deleted
+    """
+    columns = [col[0] for col in metadata['schema']]
+    keys = row_key(metadata)
+    target = quote_identifier(table_name)
+    progress.begin(table_name)
+    on_batch = lambda batch_rows: progress.add(table_name, batch_rows)
+    duck_cur = duck_conn.cursor()
+    pg_conn = psycopg2.connect(connection_string)
+    try:
+        with pg_conn, pg_conn.cursor() as cur:
+            # two syncs of the same table take turns instead of both shipping the same rows
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"{SYNC_STATE}.{table_name}"])
+            if not keys:
+                cur.execute(f"DELETE FROM {target}")
+                upserted = copy_batches(cur, table_name, columns, read_batches(duck_cur, table_name, metadata), on_batch)
+                deleted = None
+            else:
+                duck_cur.register('_sync_state', read_sync_state(cur, table_name))
+                hashed = hashed_rows(table_name, metadata)
+
+                # rows whose key is new or whose hash moved
+                cur.execute(f"CREATE TEMP TABLE _sync_rows (LIKE {target}) ON COMMIT DROP")
+                cur.execute("ALTER TABLE _sync_rows ADD COLUMN _sync_key TEXT, ADD COLUMN _sync_hash BIGINT")
+                changed = f"(SELECT h.* FROM ({hashed}) h ANTI JOIN _sync_state s ON h._sync_key = s.key AND h._sync_hash = s.row_hash)"
+                upserted = copy_batches(cur, '_sync_rows', columns + ['_sync_key', '_sync_hash'],
+                                        read_batches(duck_cur, table_name, metadata, changed, ['_sync_key', '_sync_hash']), on_batch)
+                if upserted:
+                    upsert_rows(cur, table_name, '_sync_rows', columns, keys)
+                    cur.execute(f"INSERT INTO {SYNC_STATE} (table_name, key, row_hash) SELECT %s, _sync_key, _sync_hash FROM _sync_rows \
+                                ON CONFLICT (table_name, key) DO UPDATE SET row_hash = EXCLUDED.row_hash", [table_name])
+
+                # keys shipped before that aren't in DuckDB anymore
+                cur.execute("CREATE TEMP TABLE _sync_removed (key TEXT) ON COMMIT DROP")
+                removed = duck_cur.execute(f"SELECT s.key FROM _sync_state s ANTI JOIN ({hashed}) h ON s.key = h._sync_key")
+                deleted = copy_batches(cur, '_sync_removed', ['key'], removed.fetch_record_batch(BATCH_ROWS))
+                if deleted:
+                    types = {col_name: postgres_type(col_type) for col_name, col_type, _ in metadata['schema']}
+                    match = ' AND '.join(f"t.{quote_identifier(key)} = (r.key::jsonb ->> '{key}')::{types[key]}" for key in keys)
+                    cur.execute(f"DELETE FROM {target} t USING _sync_removed r WHERE {match}")
+                    cur.execute(f"DELETE FROM {SYNC_STATE} s USING _sync_removed r WHERE s.table_name = %s AND s.key = r.key", [table_name])
+                duck_cur.unregister('_sync_state')
+
+            rows, mark = watermark
+            cur.execute(f"INSERT INTO {SYNC_WATERMARKS} (table_name, watermark, rows, synced_at) VALUES (%s, %s, %s, now()) \
+                        ON CONFLICT (table_name) DO UPDATE SET watermark = EXCLUDED.watermark, rows = EXCLUDED.rows, \
+                        synced_at = EXCLUDED.synced_at", [table_name, mark, rows])
+    finally:
+        pg_conn.close()
+        duck_cur.close()
+    print(f"Synced {table_name}: {upserted:,} rows upserted" + (f", {deleted:,} deleted" if deleted is not None else " (replaced, no key)"))
+    return upserted, deleted
+
+def sync(duckdb_path, connection_string, tables=None, workers=None):
+    """
+    Bring every table (or just tables) in Postgres up to date with the DuckDB file, skipping the ones whose watermark
+    hasn't moved since the last sync, returns {table: (rows upserted, rows deleted)} for the tables that were synced
+    """
+    start = time.perf_counter()
+    duck_conn = duckdb.connect(duckdb_path, read_only=True)
+    try:
+        table_metadata = get_table_metadata(duck_conn, tables)
+        watermarks = table_watermarks(duck_conn, table_metadata)
+
+        pg_conn = psycopg2.connect(connection_string)
+        try:
+            create_postgres_tables(pg_conn, table_metadata)
+            create_sync_tables(pg_conn)
+            with pg_conn.cursor() as cur:
+                cur.execute(f"SELECT table_name, watermark FROM {SYNC_WATERMARKS}")
+                synced = dict(cur.fetchall())
+        finally:
+            pg_conn.close()
+
+        changed = [table_name for table_name in table_metadata if synced.get(table_name) != watermarks[table_name][1]]
+        for table_name in table_metadata:
+            if table_name not in changed:
+                print(f"Unchanged: {table_name}")
+
+        progress = Progress()
+        with ThreadPoolExecutor(max_workers=workers or WORKERS) as pool:
+            futures = {table_name: pool.submit(sync_table, duck_conn, connection_string, table_name,
+                                               table_metadata[table_name], watermarks[table_name], progress)
+                       for table_name in changed}
+            results = {table_name: future.result() for table_name, future in futures.items()}
+    finally:
+        duck_conn.close()
+
+    upserted = sum(result[0] for result in results.values())
+    deleted = sum(result[1] or 0 for result in results.values())
+    print(f"Synced {len(results)} of {len(table_metadata)} tables in {time.perf_counter() - start:.2f}s: "
+          f"{upserted:,} rows upserted, {deleted:,} deleted")
+    return results
 
 def main():
     # Load environment variables
     load_dotenv()
-    
+
     # Configuration
-    duckdb_path = "database.db"  # Update this to your DuckDB file path
+    duckdb_path = os.getenv('DUCKDB_PATH', 'database.db')
     postgres_connection_string = os.getenv('DIRECT_URL')
-    
+
     if not postgres_connection_string:
-        raise ValueError("DB_CONN environment variable not found")
-    
-    # Extract data and metadata from DuckDB
-    exported_files, table_metadata = extract_tables_from_duckdb(duckdb_path)
-    
-    # Create tables with constraints in PostgreSQL
-    create_postgres_tables(postgres_connection_string, table_metadata)
-    
-    # Import data into PostgreSQL
-    import_csv_to_postgres(postgres_connection_string, exported_files)
-    
-    # Clean up CSV files
-    for _, csv_path in exported_files:
-        os.remove(csv_path)
-    os.rmdir('exports')
-    
-    print("Migration completed successfully!")
+        raise ValueError("DIRECT_URL environment variable not found")
+
+    args = sys.argv[1:]
+    if '--sync' in args:
+        args.remove('--sync')
+        sync(duckdb_path, postgres_connection_string, args or None)
+        print("Sync completed successfully!")
+    else:
+        migrate(duckdb_path, postgres_connection_string, args or None)
+        print("Migration completed successfully!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
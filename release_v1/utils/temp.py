@@ -1,81 +1,81 @@
 import duckdb
-from sqlalchemy import create_engine, text
+import psycopg2
 import os
 from dotenv import load_dotenv
+from duckdb_to_psql import BATCH_ROWS, copy_batches
 
-def get_unique_player_positions(duck_conn):
-    """Get unique player-position combinations from DuckDB"""
-    query = """
-    SELECT DISTINCT name, position
-    FROM Players
-    ORDER BY name, position
+def bulk_load(duck_conn, pg_conn, query, staging_table, staging_columns, insert_sql, report_sql=None):
     """
-    return duck_conn.execute(query).fetchall()
+    COPY the rows of a DuckDB query into a temp table, then run insert_sql (a set based INSERT ... SELECT from the
+    temp table) and report_sql against it, all in one transaction. The number of round trips doesn't depend on the
+    number of rows. Returns (rows staged, rows inserted, rows of report_sql)
+    """
+    with pg_conn, pg_conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {staging_table} ({', '.join(staging_columns)}) ON COMMIT DROP")
+        reader = duck_conn.execute(query).fetch_record_batch(BATCH_ROWS)
+        staged = copy_batches(cur, staging_table, [column.split()[0] for column in staging_columns], reader)
+
+        cur.execute(insert_sql)
+        inserted = cur.rowcount
+
+        report = []
+        if report_sql:
+            cur.execute(report_sql)
+            report = cur.fetchall()
+    return staged, inserted, report
 
-def get_player_id_mapping(pg_conn):
-    """Get mapping of player names to playerIds"""
-    query = text('SELECT "playerId", name FROM "Players"')
-    result = pg_conn.execute(query)
-    return {row.name: row.playerId for row in result}
+def load_player_positions(duck_conn, pg_conn):
+    """
+    Insert every unique player-position combination from DuckDB, resolving playerIds by name and team in Postgres
+    (two players can share a name, a player's name is only unique on their team)
+    """
+    return bulk_load(duck_conn, pg_conn,
+        "SELECT DISTINCT name, team, position FROM Players ORDER BY name, team, position",
+        "_stage_player_positions", ["name TEXT", "team TEXT", "position_code TEXT"],
+        """
+        INSERT INTO "PlayerPositions" ("playerId", "position_code")
+        SELECT p."playerId", s.position_code
+        FROM _stage_player_positions s
+        JOIN "Teams" t ON t."displayName" = s.team
+        JOIN "Players" p ON p.name = s.name AND p."teamId" = t."teamId"
+        ON CONFLICT ("playerId", "position_code") DO NOTHING
+        """,
+        # players we couldn't find a playerId for
+        """
+        SELECT DISTINCT s.name, s.team
+        FROM _stage_player_positions s
+        LEFT JOIN "Teams" t ON t."displayName" = s.team
+        LEFT JOIN "Players" p ON p.name = s.name AND p."teamId" = t."teamId"
+        WHERE p."playerId" IS NULL
+        ORDER BY s.name, s.team
+        """)
 
 def main():
     # Load environment variables
     load_dotenv()
-    
+
     postgres_url = os.getenv('DIRECT_URL')
     if not postgres_url:
         raise ValueError("DIRECT_URL environment variable not found")
-    
+
     # Initialize connections
-    duck_conn = duckdb.connect("database.db")  # Update path as needed
-    pg_engine = create_engine(postgres_url)
-    
+    duck_conn = duckdb.connect(os.getenv('DUCKDB_PATH', 'database.db'), read_only=True)
+    pg_conn = psycopg2.connect(postgres_url)
+
     try:
-        # Get data from DuckDB
-        player_positions = get_unique_player_positions(duck_conn)
-        print(f"Found {len(player_positions)} unique player-position combinations")
-        
-        with pg_engine.connect() as pg_conn:
-            # Get player ID mapping
-            player_mapping = get_player_id_mapping(pg_conn)
-            
-            # Prepare entries for insertion
-            entries = []
-            skipped = 0
-            for name, position_code in player_positions:
-                # Skip if we can't find the player
-                if name not in player_mapping:
-                    print(f"Warning: Could not find playerId for {name}")
-                    skipped += 1
-                    continue
-                
-                entries.append({
-                    "playerId": player_mapping[name],
-                    "position_code": position_code
-                })
-            
-            # Insert in batches of 100
-            batch_size = 100
-            inserted = 0
-            for i in range(0, len(entries), batch_size):
-                batch = entries[i:i + batch_size]
-                insert_query = text("""
-                    INSERT INTO "PlayerPositions" ("playerId", "position_code")
-                    VALUES (:playerId, :position_code)
-                    ON CONFLICT ("playerId", "position_code") DO NOTHING
-                """)
-                result = pg_conn.execute(insert_query, batch)
-                inserted += result.rowcount
-                pg_conn.commit()
-                print(f"Inserted batch {i//batch_size + 1}")
-            
-            print(f"\nResults:")
-            print(f"Total entries found: {len(player_positions)}")
-            print(f"Entries skipped: {skipped}")
-            print(f"Entries inserted: {inserted}")
-            
+        staged, inserted, skipped = load_player_positions(duck_conn, pg_conn)
+
+        for name, team in skipped:
+            print(f"Warning: Could not find playerId for {name} ({team})")
+
+        print(f"\nResults:")
+        print(f"Total entries found: {staged}")
+        print(f"Players skipped: {len(skipped)}")
+        print(f"Entries inserted: {inserted}")
+
     finally:
+        pg_conn.close()
         duck_conn.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()